@@ -1,52 +1,61 @@
-"""Scan an ADF image an visit all files"""
+"""Scan an ADF/ADZ/HDF image and visit all files"""
 
-import subprocess
+from amitools.fs.blkdev.BlkDevFactory import BlkDevFactory
+from amitools.fs.ADFSVolume import ADFSVolume
+from amitools.fs.FSError import *
 
 class ADFScanner:
 
-  def __init__(self, unadf_exe, handler, stop_on_error=True):
+  def __init__(self, handler, stop_on_error=True):
     self.handler = handler
-    self.unadf_exe = unadf_exe
     self.stop_on_error = stop_on_error
 
   def scan_adf(self, file_name):
-    # call "lha l file" to get file list
-    cmd = [ self.unadf_exe, '-lr', file_name]
-    p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-    com = p.communicate()
-    output = com[0]
-    error = com[1]
-    if p.returncode != 0:
-      # no DOS disk? -> ignore it
-      if error.find("<adfReadRootBlock : id not found>") != -1:
-        return True
-      elif self.stop_on_error:
-        print error
-        return False
-      else:
-        return True
+    # open image file
+    try:
+      blkdev = BlkDevFactory().open(file_name, read_only=True)
+    except (IOError, ValueError), e:
+      return self._error(file_name, e)
+    try:
+      # open volume
+      volume = ADFSVolume(blkdev)
+      try:
+        volume.open()
+      except FSError, e:
+        # no DOS disk? -> ignore it
+        if e.code in (INVALID_BOOT_BLOCK, INVALID_ROOT_BLOCK):
+          return True
+        return self._error(file_name, e)
+      # walk through all files
+      return self._scan_dir(file_name, volume.get_root_dir())
+    finally:
+      blkdev.close()
 
-     # process archive list
-    lines = output.splitlines()
-    file_list = []
-    for entry in lines[3:]:
-      entry_name = entry[31:]
-      if not entry_name.endswith('/'):
-        file_list.append(entry_name)
+  def _error(self, file_name, e):
+    if self.stop_on_error:
+      print "%s: %s" % (file_name, e)
+      return False
+    else:
+      return True
 
-     # now extract the files 
-    for entry_name in file_list:
-       # call "lha p file.lha entry" to get a file 
-       cmd = [self.unadf_exe, '-p', file_name, entry_name]
-       p = subprocess.Popen(cmd, stdout=subprocess.PIPE, stderr=subprocess.PIPE)
-       com = p.communicate()
-       data = com[0]
-       error = com[1]
-       if p.returncode != 0:
-         print error
-         return False
-       if len(output) > 0:
-         ok = self.handler(file_name, entry_name, data)
-         if not ok:
-           return False
-    return True
\ No newline at end of file
+  def _scan_dir(self, file_name, node):
+    try:
+      entries = node.get_entries_sorted_by_name()
+    except FSError, e:
+      return self._error(file_name, e)
+    for entry in entries:
+      if entry.is_dir():
+        ok = self._scan_dir(file_name, entry)
+      else:
+        try:
+          data = entry.get_file_data()
+        except FSError, e:
+          ok = self._error(file_name, e)
+        else:
+          entry_name = str(entry.get_node_path_name())
+          ok = self.handler(file_name, entry_name, data)
+      # release contents of entry
+      entry.flush()
+      if not ok:
+        return False
+    return True
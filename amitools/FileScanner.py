@@ -7,14 +7,18 @@ import ADFScanner
 
 class FileScanner:
   
-  def __init__(self, handler, use_adf = None, use_lha = None, stop_on_error = True):
+  # file extensions of disk images and archives
+  adf_exts = (".adf", ".adz", ".adf.gz", ".hdf")
+  lha_exts = (".lha", ".lzh")
+
+  def __init__(self, handler, use_adf = False, use_lha = False, stop_on_error = True):
     self.handler = handler
     if use_adf:
-      self.adf_scanner = ADFScanner.ADFScanner(use_adf, lambda a,b,c: self.handle_ext_file(a,b,c), stop_on_error=stop_on_error)
+      self.adf_scanner = ADFScanner.ADFScanner(lambda a,b,c: self.handle_ext_file(a,b,c), stop_on_error=stop_on_error)
     else:
       self.adf_scanner = None
     if use_lha:
-      self.lha_scanner = LHAScanner.LHAScanner(use_lha, lambda a,b,c: self.handle_ext_file(a,b,c))
+      self.lha_scanner = LHAScanner.LHAScanner(lambda a,b,c: self.handle_ext_file(a,b,c), stop_on_error=stop_on_error)
     else:
       self.lha_scanner = None
   
@@ -40,12 +44,12 @@ class FileScanner:
 
   def handle_file(self, path):
     lpath = path.lower()
-    if lpath.endswith(".adf"):
+    if lpath.endswith(self.adf_exts):
       return self.handle_adf(path)
-    elif lpath.endswith(".lha"):
+    elif lpath.endswith(self.lha_exts):
       return self.handle_lha(path)
     else:
-      with open(path) as fobj:
+      with open(path, "rb") as fobj:
         return self.call_handler(path, fobj)
 
   def handle_dir(self, path):
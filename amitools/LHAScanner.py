@@ -1,38 +1,45 @@
 """Scan LHA archives and visit all files"""
 
-import subprocess
+from amitools.util.LHA import LHAFile, LHAError
 
 class LHAScanner:
 
-  def __init__(self, lha_exe, handler):
+  def __init__(self, handler, stop_on_error=True):
     self.handler = handler
-    self.lha_exe = lha_exe
+    self.stop_on_error = stop_on_error
 
   def scan_lha(self, file_name):
-    # call "lha l file" to get file list
-    p = subprocess.Popen([self.lha_exe, 'l',file_name], stdout=subprocess.PIPE)
-    output = p.communicate()[0]
-    if p.returncode != 0:
-      return False
-  
-    # process archive list
-    lines = output.splitlines()
-    file_list = []
-    for entry in lines[2:-2]:
-      entry_name = entry[51:]
-      file_list.append(entry_name)
-      
-    # now extract the files 
-    for entry_name in file_list:
-      # call "lha p file.lha entry" to get a file 
-      cmd = [self.lha_exe, 'pq',file_name,entry_name]
-      p = subprocess.Popen(cmd, stdout=subprocess.PIPE)
-      data = p.communicate()[0]
-      if p.returncode != 0:
-        return False
-      if len(output) > 0:
-        ok = self.handler(file_name, entry_name, data)
-        if not ok:
+    # read archive and parse all headers
+    try:
+      with open(file_name, "rb") as fobj:
+        lha = LHAFile(fobj.read())
+      entries = lha.read()
+    except (IOError, LHAError), e:
+      return self._error(file_name, e)
+
+    # now extract the files
+    for entry in entries:
+      if entry.is_dir():
+        continue
+      try:
+        data = lha.extract(entry)
+      except LHAError, e:
+        # unsupported compression? -> skip file
+        if not entry.is_supported():
+          print "%s: %s" % (file_name, e)
+          continue
+        if not self._error(file_name, e):
           return False
+        continue
+      ok = self.handler(file_name, entry.name, data)
+      if not ok:
+        return False
+
+    return True
 
-    return True
\ No newline at end of file
+  def _error(self, file_name, e):
+    if self.stop_on_error:
+      print "%s: %s" % (file_name, e)
+      return False
+    else:
+      return True
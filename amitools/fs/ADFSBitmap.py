@@ -1,11 +1,28 @@
-import struct
+import array
+import bisect
+import binascii
 import ctypes
+import sys
 
 from block.BitmapBlock import BitmapBlock
 from block.BitmapExtBlock import BitmapExtBlock
 from FSError import *
 
+# array type code for unsigned 32 bit values
+if array.array('I').itemsize == 4:
+  _long_type = 'I'
+else:
+  _long_type = 'L'
+
 class ADFSBitmap:
+  """the allocation bitmap of a volume.
+
+     The bitmap is kept in a bytearray in on-disk layout: a set bit marks a
+     free block. Additionally an index of the free extents (runs of free
+     blocks) is kept in a sorted list of start blocks and a map of start
+     block to run length. It is built on first use and updated with every
+     bit change. alloc_n() uses it to hand out contiguous runs of blocks.
+  """
   def __init__(self, root_blk):
     self.root_blk = root_blk
     self.blkdev = self.root_blk.blkdev
@@ -14,6 +31,11 @@ class ADFSBitmap:
     self.bitmap_blks = []
     self.bitmap_data = None
     self.valid = False
+    # free extents index: sorted start blocks and start -> length
+    self.ext_starts = None
+    self.ext_lens = None
+    # indices of bitmap blocks that need to be written
+    self.dirty_blks = set()
     # bitmap block entries
     self.bitmap_blk_bytes = root_blk.blkdev.block_bytes - 4
     self.bitmap_blk_longs = root_blk.blkdev.block_longs - 1
@@ -34,9 +56,8 @@ class ADFSBitmap:
   
   def create(self):
     # create data and preset with 0xff
-    self.bitmap_data = ctypes.create_string_buffer(self.bitmap_all_blk_bytes)
-    for i in xrange(self.bitmap_all_blk_bytes):
-      self.bitmap_data[i] = chr(0xff)
+    self.bitmap_data = bytearray('\xff' * self.bitmap_all_blk_bytes)
+    self.ext_starts = None
 
     # clear bit for root block
     blk_pos = self.root_blk.blk_num
@@ -90,19 +111,22 @@ class ADFSBitmap:
     # write ext blocks
     for ext_blk in self.ext_blks:
       ext_blk.write()
+    self.dirty_blks = set(xrange(len(self.bitmap_blks)))
     self.write_only_bits()
-      
+
   def write_only_bits(self):
-    # write bitmap blocks
-    off = 0
-    for blk in self.bitmap_blks:
-      blk.set_bitmap_data(self.bitmap_data[off:off+self.bitmap_blk_bytes])
+    # write modified bitmap blocks
+    n = self.bitmap_blk_bytes
+    for i in sorted(self.dirty_blks):
+      off = i * n
+      blk = self.bitmap_blks[i]
+      blk.set_bitmap_data(str(self.bitmap_data[off:off+n]))
       blk.write()
-      off += self.bitmap_blk_bytes
+    self.dirty_blks.clear()
   
   def read(self):
     self.bitmap_blks = []
-    bitmap_data = ""
+    bitmap_datas = []
     
     # get bitmap blocks from root block
     blocks = self.root_blk.bitmap_ptrs
@@ -114,7 +138,7 @@ class ADFSBitmap:
       if not bm.valid:
         raise FSError(INVALID_BITMAP_BLOCK, block=bm)
       self.bitmap_blks.append(bm)
-      bitmap_data += bm.get_bitmap_data()
+      bitmap_datas.append(bm.get_bitmap_data())
       
     # now check extended bitmap blocks
     ext_blk = self.root_blk.bitmap_ext_blk
@@ -130,11 +154,12 @@ class ADFSBitmap:
         bm.read()
         if not bm.valid:
           raise FSError(INVALID_BITMAP_BLOCK, block=bm)
-        bitmap_data += bm.get_bitmap_data()
+        bitmap_datas.append(bm.get_bitmap_data())
         self.bitmap_blks.append(bm)
       ext_blk = bm_ext.bitmap_ext_blk
 
     # check bitmap data
+    bitmap_data = "".join(bitmap_datas)
     num_bm_blks = len(self.bitmap_blks)
     num_bytes = self.bitmap_blk_bytes * num_bm_blks
     if num_bytes != len(bitmap_data):
@@ -143,102 +168,282 @@ class ADFSBitmap:
       raise FSError(BITMAP_BLOCK_COUNT_MISMATCH, node=self, extra="got=%d want=%d" % (self.bitmap_num_blks, num_bm_blks))
 
     # create a modyfiable bitmap
-    self.bitmap_data = ctypes.create_string_buffer(bitmap_data)
+    self.bitmap_data = bytearray(bitmap_data)
+    self.ext_starts = None
     self.valid = True
 
+  # ----- free extents index -----
+
+  def _get_longs(self):
+    longs = array.array(_long_type)
+    longs.fromstring(str(self.bitmap_data[:self.bitmap_longs * 4]))
+    if sys.byteorder == 'little':
+      longs.byteswap()
+    return longs
+
+  def _build_extents(self):
+    """scan the bitmap and collect all runs of free blocks"""
+    starts = []
+    lens = {}
+    res = self.blkdev.reserved
+    run_start = None
+    off = 0
+    for val in self._get_longs():
+      if val == 0xffffffff:
+        if run_start == None:
+          run_start = off
+      elif val == 0:
+        if run_start != None:
+          starts.append(run_start + res)
+          lens[run_start + res] = off - run_start
+          run_start = None
+      else:
+        for i in xrange(min(32, self.bitmap_bits - off)):
+          if val & (1 << i):
+            if run_start == None:
+              run_start = off + i
+          elif run_start != None:
+            starts.append(run_start + res)
+            lens[run_start + res] = off + i - run_start
+            run_start = None
+      off += 32
+    if run_start != None and run_start < self.bitmap_bits:
+      starts.append(run_start + res)
+      lens[run_start + res] = min(off, self.bitmap_bits) - run_start
+    self.ext_starts = starts
+    self.ext_lens = lens
+
+  def _get_extents(self):
+    if self.ext_starts == None:
+      self._build_extents()
+    return self.ext_starts
+
+  def _find_extent(self, pos):
+    """return index of the extent containing pos or the next one after it"""
+    starts = self._get_extents()
+    i = bisect.bisect_right(starts, pos) - 1
+    if i >= 0 and starts[i] + self.ext_lens[starts[i]] > pos:
+      return i
+    return i + 1
+
+  def _extent_add(self, blk_num):
+    """block became free: extend or merge extents"""
+    starts = self.ext_starts
+    lens = self.ext_lens
+    i = bisect.bisect_right(starts, blk_num)
+    # merge with previous?
+    if i > 0 and starts[i-1] + lens[starts[i-1]] == blk_num:
+      i -= 1
+      lens[starts[i]] += 1
+    else:
+      starts.insert(i, blk_num)
+      lens[blk_num] = 1
+    # merge with next?
+    if i + 1 < len(starts) and starts[i+1] == blk_num + 1:
+      nxt = starts.pop(i+1)
+      lens[starts[i]] += lens.pop(nxt)
+
+  def _extent_remove(self, blk_num, num=1):
+    """blocks inside a single extent became used: shrink or split it"""
+    starts = self.ext_starts
+    lens = self.ext_lens
+    i = bisect.bisect_right(starts, blk_num) - 1
+    s = starts[i]
+    n = lens.pop(s)
+    end = s + n
+    del starts[i]
+    if s < blk_num:
+      starts.insert(i, s)
+      lens[s] = blk_num - s
+      i += 1
+    if blk_num + num < end:
+      starts.insert(i, blk_num + num)
+      lens[blk_num + num] = end - blk_num - num
+
+  def get_free_extents(self):
+    """return a list of (start, length) of all free block runs"""
+    return [(s, self.ext_lens[s]) for s in self._get_extents()]
+
+  # ----- search -----
+
+  def _wrap(self, pos):
+    if pos >= self.bitmap_bits + self.blkdev.reserved or pos < self.blkdev.reserved:
+      pos = self.blkdev.reserved
+    return pos
+
   def find_free(self, start=None):
     # give start of search
     if start == None:
       pos = self.find_start
     else:
       pos = start
-    # at most scan all bits
-    num = self.bitmap_bits
-    while num > 0:
-      # a free bit?
-      found = self.get_bit(pos)
-      old_pos = pos
-      pos += 1
-      if pos == self.bitmap_bits + self.blkdev.reserved:
-        pos = self.blkdev.reserved
-      if found:
-        # start a next position
-        self.find_start = pos
-        return old_pos
-      num -= 1
-    return None
+    pos = self._wrap(pos)
+    starts = self._get_extents()
+    if len(starts) == 0:
+      return None
+    i = self._find_extent(pos)
+    if i == len(starts):
+      # wrap around
+      found = starts[0]
+    else:
+      found = max(pos, starts[i])
+    # start a next position
+    self.find_start = self._wrap(found + 1)
+    return found
 
   def find_n_free(self, num, start=None):
-    first_blk = self.find_free(start)
-    if first_blk == None:
+    """find num free blocks. prefer a contiguous run at or after the start
+       position. if there is none then the blocks of the next runs are taken.
+    """
+    if start == None:
+      pos = self.find_start
+    else:
+      pos = start
+    pos = self._wrap(pos)
+    starts = self._get_extents()
+    lens = self.ext_lens
+    n = len(starts)
+    if n == 0:
       return None
-    if num == 1:
-      return [first_blk]
-    result = [first_blk]
-    for i in xrange(num-1):
-      blk_num = self.find_free()
-      if blk_num == None:
-        return None
-      if blk_num in result:
-        return None
-      result.append(blk_num)
-    return result
-    
+    first = self._find_extent(pos)
+    if first == n:
+      # wrap around
+      first = 0
+      pos = self.blkdev.reserved
+    # first fit: search a run that is large enough. the run containing
+    # pos is tried from pos first and from its begin at the end
+    for j in xrange(n + 1):
+      i = (first + j) % n
+      s = starts[i]
+      if j == 0 and s < pos:
+        if s + lens[s] - pos < num:
+          continue
+        s = pos
+      elif lens[s] < num:
+        continue
+      self.find_start = self._wrap(s + num)
+      return range(s, s + num)
+    # fragmented: collect blocks of all runs
+    result = []
+    for j in xrange(n + 1):
+      i = (first + j) % n
+      s = starts[i]
+      e = s + lens[s]
+      if j == 0:
+        s = max(s, pos)
+      elif j == n:
+        e = min(e, pos)
+      while s < e and len(result) < num:
+        result.append(s)
+        s += 1
+      if len(result) == num:
+        self.find_start = self._wrap(result[-1] + 1)
+        return result
+    return None
+
   def get_num_free(self):
+    """count the free blocks with a popcount of the bitmap"""
+    full_longs = self.bitmap_bits / 32
+    data = self.bitmap_data[:full_longs * 4]
     num = 0
-    for i in xrange(self.bitmap_bits):
-      if self.get_bit(i):
-        num+=1
+    if len(data) > 0:
+      num = bin(int(binascii.hexlify(data), 16)).count('1')
+    # last long is used partially
+    rest = self.bitmap_bits % 32
+    if rest > 0:
+      off = full_longs * 4
+      val = (self.bitmap_data[off] << 24) | (self.bitmap_data[off+1] << 16) | \
+            (self.bitmap_data[off+2] << 8) | self.bitmap_data[off+3]
+      num += bin(val & ((1 << rest) - 1)).count('1')
     return num
 
+  # ----- allocation -----
+
   def alloc_n(self, num, start=None):
     free_blks = self.find_n_free(num, start)
     if free_blks == None:
       return None
-    for b in free_blks:
-      self.clr_bit(b)
+    # the free blocks form runs inside the free extents
+    n = len(free_blks)
+    i = 0
+    while i < n:
+      j = i + 1
+      while j < n and free_blks[j] == free_blks[j-1] + 1:
+        j += 1
+      self._clr_run(free_blks[i], j - i)
+      i = j
     self.write_only_bits()
     return free_blks
 
+  def _clr_run(self, blk_num, num):
+    """mark a run of free blocks as used and update the extents once"""
+    data = self.bitmap_data
+    blk_bytes = self.bitmap_blk_bytes
+    dirty = self.dirty_blks
+    res = self.blkdev.reserved
+    b = blk_num
+    end = blk_num + num
+    while b < end:
+      byte_off, mask = self._bit_pos(b)
+      # a full byte of the bitmap?
+      if (b - res) % 8 == 0 and b + 8 <= end:
+        data[byte_off] = 0
+        b += 8
+      else:
+        data[byte_off] &= ~mask
+        b += 1
+      dirty.add(byte_off / blk_bytes)
+    if self.ext_starts != None:
+      self._extent_remove(blk_num, num)
+
   def dealloc_n(self, blks):
     for b in blks:
       self.set_bit(b)
     self.write_only_bits()
 
-  def get_bit(self, off):
+  def _bit_pos(self, off):
+    """return (byte offset, mask) of a block's bit or None if out of range"""
     if off < self.blkdev.reserved or off >= self.blkdev.num_blocks:
       return None
     off = (off - self.blkdev.reserved)
     long_off = off / 32
     bit_off = off % 32
-    val = struct.unpack_from(">I", self.bitmap_data, long_off * 4)[0]
-    mask = 1 << bit_off
-    return (val & mask) == mask
+    # longs are stored big endian
+    return (long_off * 4 + 3 - bit_off / 8, 1 << (bit_off % 8))
+
+  def get_bit(self, off):
+    pos = self._bit_pos(off)
+    if pos == None:
+      return None
+    byte_off, mask = pos
+    return (self.bitmap_data[byte_off] & mask) == mask
 
   # mark as free
   def set_bit(self, off):
-    if off < self.blkdev.reserved or off >= self.blkdev.num_blocks:
+    pos = self._bit_pos(off)
+    if pos == None:
       return False
-    off = (off - self.blkdev.reserved)
-    long_off = off / 32
-    bit_off = off % 32
-    val = struct.unpack_from(">I", self.bitmap_data, long_off * 4)[0]
-    mask = 1 << bit_off
-    val = val | mask
-    struct.pack_into(">I", self.bitmap_data, long_off * 4, val)
+    byte_off, mask = pos
+    val = self.bitmap_data[byte_off]
+    if val & mask == 0:
+      self.bitmap_data[byte_off] = val | mask
+      self.dirty_blks.add(byte_off / self.bitmap_blk_bytes)
+      if self.ext_starts != None:
+        self._extent_add(off)
     return True
-  
+
   # mark as used
   def clr_bit(self, off):
-    if off < self.blkdev.reserved or off >= self.blkdev.num_blocks:
+    pos = self._bit_pos(off)
+    if pos == None:
       return False
-    off = (off - self.blkdev.reserved)
-    long_off = off / 32
-    bit_off = off % 32
-    val = struct.unpack_from(">I", self.bitmap_data, long_off * 4)[0]
-    mask = 1 << bit_off
-    val = val & ~mask
-    struct.pack_into(">I", self.bitmap_data, long_off * 4, val)
+    byte_off, mask = pos
+    val = self.bitmap_data[byte_off]
+    if val & mask == mask:
+      self.bitmap_data[byte_off] = val & ~mask
+      self.dirty_blks.add(byte_off / self.bitmap_blk_bytes)
+      if self.ext_starts != None:
+        self._extent_remove(off)
     return True
 
   def dump(self):
@@ -2,8 +2,9 @@ import struct
 from block.Block import Block
 from block.UserDirBlock import UserDirBlock
 from block.DirCacheBlock import * 
-from ADFSFile import ADFSFile
+from ADFSFile import ADFSFile, calc_num_data_blks, calc_num_list_blks
 from ADFSNode import ADFSNode
+from ADFSStat import ADFSStat
 from FileName import FileName
 from FSError import *
 from FSString import FSString
@@ -15,6 +16,9 @@ class ADFSDir(ADFSNode):
     # state
     self.entries = None
     self.dcache_blks = None
+    self.dcache_stale = False
+    # sub dir nodes created while listing from the dircache
+    self.dcache_nodes = {}
     self.name_hash = None
     self.valid = False
     
@@ -38,8 +42,13 @@ class ADFSDir(ADFSNode):
     if blk.valid_chksum and blk.type == Block.T_SHORT:
       # its a userdir
       if blk.sub_type == Block.ST_USERDIR:
-        node = ADFSDir(self.volume, self)
-        blk = node.blocks_create_old(blk)
+        # reuse a node already created from the dircache
+        node = self.dcache_nodes.get(blk.blk_num)
+        if node != None:
+          blk = node.block
+        else:
+          node = ADFSDir(self.volume, self)
+          blk = node.blocks_create_old(blk)
         if recursive:
           node.read()
       # its a file
@@ -56,71 +65,211 @@ class ADFSDir(ADFSNode):
     self.name_hash = []
     for i in xrange(self.block.hash_size):
       self.name_hash.append([])      
-  
-  def read(self, recursive=False):
-    self._init_name_hash()
-    self.entries = [] 
-     
-    # create initial list with blk_num/hash_index for dir scan
-    blocks = []
-    for i in xrange(self.block.hash_size):
-      blk_num = self.block.hash_table[i]
-      if blk_num != 0:
-        blocks.append((blk_num,i))
-  
-    for blk_num,hash_idx in blocks:
+
+  def _reset_name_hash(self):
+    # None marks a hash chain that was not read yet
+    self.name_hash = [None] * self.block.hash_size
+
+  def _read_chain(self, hash_idx, recursive=False):
+    """read the nodes of a single hash chain.
+       return False if an invalid block was found
+    """
+    chain = []
+    self.name_hash[hash_idx] = chain
+    blk_num = self.block.hash_table[hash_idx]
+    while blk_num != 0:
       # read anonymous block
       blk = Block(self.blkdev, blk_num)
       blk.read()
       if not blk.valid:
-        self.valid = False
-        return
-      # create file/dir node
-      hash_chain,node = self._read_add_node(blk, recursive)
-      # store node in entries
-      self.entries.append(node)
-      # store node in name_hash
-      self.name_hash[hash_idx].append(node)
-      # follow hash chain
-      if hash_chain != 0:
-        blocks.append((hash_chain,hash_idx))
+        return False
+      # create file/dir node and follow hash chain
+      blk_num,node = self._read_add_node(blk, recursive)
+      chain.append(node)
+    return True
+
+  def get_hash_chain(self, hash_idx):
+    """return the nodes in a hash chain. only this chain is read if the
+       directory was not read yet"""
+    if self.name_hash == None:
+      self._reset_name_hash()
+    chain = self.name_hash[hash_idx]
+    if chain == None:
+      self._read_chain(hash_idx)
+      chain = self.name_hash[hash_idx]
+    return chain
+
+  def get_name_hash(self, fn):
+    return fn.hash(hash_size=self.block.hash_size)
+  
+  def read(self, recursive=False):
+    # keep the chains already read so that nodes stay the same objects
+    if self.name_hash == None:
+      self._reset_name_hash()
+    ok = True
+    for i in xrange(self.block.hash_size):
+      if self.name_hash[i] == None:
+        if not self._read_chain(i, recursive):
+          ok = False
+          break
+
+    # entries are ordered like a breadth first walk of all hash chains
+    self.entries = []
+    chains = filter(lambda x: x, self.name_hash)
+    depth = 0
+    while len(chains) > 0:
+      for chain in chains:
+        self.entries.append(chain[depth])
+      depth += 1
+      chains = filter(lambda x: len(x) > depth, chains)
+    if not ok:
+      self.valid = False
+      return
     
     # dircaches available?
-    if self.volume.is_dircache:
-      self.dcache_blks = []
-      dcb_num = self.block.extension
-      while dcb_num != 0:
-        dcb = DirCacheBlock(self.blkdev, dcb_num)
-        dcb.read()
-        if not dcb.valid:
-          self.valid = False
-          return
-        self.dcache_blks.append(dcb)
-        dcb_num = dcb.next_cache
+    if self.volume.is_dircache and self.dcache_blks == None:
+      if not self._read_dircache():
+        self.valid = False
+        return
+
+  def _read_dircache(self):
+    """read the chain of dircache blocks. return False if it is broken"""
+    self.dcache_blks = []
+    dcb_num = self.block.extension
+    while dcb_num != 0:
+      dcb = DirCacheBlock(self.blkdev, dcb_num)
+      dcb.read()
+      if not dcb.valid or dcb.parent != self.block.blk_num:
+        self.dcache_stale = True
+        return False
+      self.dcache_blks.append(dcb)
+      dcb_num = dcb.next_cache
+    return True
+
+  def ensure_dircache(self):
+    if self.dcache_blks == None and self.volume.is_dircache:
+      self._read_dircache()
+
+  def get_dircache_records(self):
+    """return all dircache records of this dir or None if the volume has
+       no dircache or the cache of this dir is stale.
+
+       The cache is only checked against the entries if they were already
+       read. Other mismatches are found when a record is followed.
+    """
+    if not self.volume.is_dircache or self.dcache_stale:
+      return None
+    self.ensure_dircache()
+    if self.dcache_stale:
+      return None
+    records = []
+    for dcb in self.dcache_blks:
+      records += dcb.records
+    if self.entries != None:
+      blks = [e.block.blk_num for e in self.entries if e != None]
+      if sorted(blks) != sorted([r.entry for r in records]):
+        self.dcache_stale = True
+        return None
+    return records
+
+  def _get_record_stat(self, r):
+    name = FileName(FSString(r.name), is_intl=self.volume.is_intl)
+    meta_info = MetaInfo(r.protect, r.mod_ts, FSString(r.comment))
+    is_dir = r.sub_type == Block.ST_USERDIR
+    return ADFSStat(name, r.size, meta_info, r.entry, is_dir)
+
+  def _get_record_dir(self, stat):
+    """return the node of the sub dir of a dircache record or None if the
+       header block does not match the record"""
+    node = self.dcache_nodes.get(stat.blk_num)
+    if node != None:
+      return node
+    # already read in its hash chain?
+    if self.name_hash != None:
+      chain = self.name_hash[self.get_name_hash(stat.name)]
+      if chain != None:
+        for e in chain:
+          if e != None and e.block.blk_num == stat.blk_num:
+            return e
+    blk = Block(self.blkdev, stat.blk_num)
+    blk.read()
+    if not blk.valid or not blk.is_user_dir_block():
+      return None
+    node = ADFSDir(self.volume, self)
+    node.blocks_create_old(blk)
+    if node.block.parent != self.block.blk_num or \
+       node.name.get_upper_ami_str() != stat.name.get_upper_ami_str():
+      return None
+    self.dcache_nodes[stat.blk_num] = node
+    return node
+
+  def get_dircache_listing(self, with_dirs=False):
+    """return a list of (stat, sub_dir_node_or_None) sorted by name taken
+       from the dircache or None if no valid dircache is available"""
+    records = self.get_dircache_records()
+    if records == None:
+      return None
+    result = []
+    for r in records:
+      stat = self._get_record_stat(r)
+      node = None
+      if with_dirs and stat.is_dir:
+        node = self._get_record_dir(stat)
+        if node == None:
+          self.dcache_stale = True
+          return None
+      result.append((stat, node))
+    return sorted(result, key=lambda x : x[0].name.get_upper_ami_str())
+
+  def stat_name(self, fn):
+    """return the ADFSStat of the entry with the given FileName or None.
+       the dircache is used if available"""
+    records = self.get_dircache_records()
+    if records != None:
+      fn_up = fn.get_upper_ami_str()
+      for r in records:
+        stat = self._get_record_stat(r)
+        if stat.name.get_upper_ami_str() == fn_up:
+          return stat
+      return None
+    node = self.find_name(fn)
+    if node == None:
+      return None
+    return node.get_stat()
     
   def flush(self):
-    if self.entries:
-      for e in self.entries:
-        e.flush()
+    if self.name_hash != None:
+      for chain in self.name_hash:
+        if chain != None:
+          for e in chain:
+            if e != None:
+              e.flush()
     self.entries = None
     self.name_hash = None
+    self.dcache_blks = None
+    self.dcache_nodes = {}
+    # cached paths below me refer to the dropped nodes
+    self.volume.invalidate_path_cache(self, with_node=False)
   
   def ensure_entries(self):
-    if not self.entries:
+    if self.entries == None:
       self.read()
       
   def get_entries(self):
     self.ensure_entries()
     return self.entries
   
-  def has_name(self, fn):
-    fn_hash = fn.hash()
+  def find_name(self, fn):
+    """return the node with the given FileName or None.
+       only the hash chain of the name is searched"""
     fn_up = fn.get_upper_ami_str()
-    node_list = self.name_hash[fn_hash]
-    for node in node_list:
-      if node.name.get_upper_ami_str() == fn_up:
-        return True
-    return False
+    for node in self.get_hash_chain(self.get_name_hash(fn)):
+      if node != None and node.name.get_upper_ami_str() == fn_up:
+        return node
+    return None
+
+  def has_name(self, fn):
+    return self.find_name(fn) != None
   
   def blocks_create_new(self, free_blks, name, hash_chain_blk, parent_blk, meta_info):
     blk_num = free_blks[0]
@@ -139,8 +288,6 @@ class ADFSDir(ADFSNode):
     return 1
     
   def _create_node(self, node, name, meta_info, update_ts=True):
-    self.ensure_entries()
-    
     # make sure a default meta_info is available
     if meta_info == None:
       meta_info = MetaInfo()
@@ -154,8 +301,8 @@ class ADFSDir(ADFSNode):
     if self.has_name(fn):
       raise FSError(NAME_ALREADY_EXISTS, file_name=name, node=self)
     # calc hash index of name
-    fn_hash = fn.hash()
-    hash_chain = self.name_hash[fn_hash]
+    fn_hash = self.get_name_hash(fn)
+    hash_chain = self.get_hash_chain(fn_hash)
     if len(hash_chain) == 0:
       hash_chain_blk = 0
     else:
@@ -174,7 +321,7 @@ class ADFSDir(ADFSNode):
 
     # dircache: create record for this node
     if self.volume.is_dircache:
-      ok = self._dircache_add_entry(name, meta_info, new_blk, node.get_size(), update_myself=False)
+      ok = self._dircache_add_entry(name, meta_info, new_blk, node.get_size(), node.block.sub_type, update_myself=False)
       if not ok:
         self.delete()
         raise FSError(NO_FREE_BLOCKS, node=self, file_name=name, extra="want dcache")
@@ -184,8 +331,10 @@ class ADFSDir(ADFSNode):
     self.block.write()
     
     # add node
-    self.name_hash[fn_hash].insert(0,node)
-    self.entries.append(node)
+    hash_chain.insert(0,node)
+    if self.entries != None:
+      self.entries.append(node)
+    self.volume.invalidate_path_cache(node)
     
     # update time stamps
     if update_ts:
@@ -211,21 +360,26 @@ class ADFSDir(ADFSNode):
     node.set_file_data(data)
     self._create_node(node, name, meta_info, update_ts) 
     return node
+
+  def create_file_stream(self, name, fobj, size, meta_info=None, update_ts=True):
+    """create a file of given size with the contents read from fobj"""
+    if not isinstance(name, FSString):
+      raise ValueError("create_file_stream's name must be a FSString")
+    node = ADFSFile(self.volume, self)
+    node.set_file_stream(fobj, size)
+    self._create_node(node, name, meta_info, update_ts)
+    return node
   
   def _delete(self, node, wipe, update_ts):
-    self.ensure_entries()
-    
     # can we delete?
     if not node.can_delete():
       raise FSError(DELETE_NOT_ALLOWED, node=node)
     # make sure its a node of mine
     if node.parent != self:
       raise FSError(INTERNAL_ERROR, node=node, extra="node parent is not me")
-    if node not in self.entries:
-      raise FSError(INTERNAL_ERROR, node=node, extra="node not in entries")      
     # get hash key
-    hash_key = node.name.hash()
-    names = self.name_hash[hash_key]
+    hash_key = self.get_name_hash(node.name)
+    names = self.get_hash_chain(hash_key)
     # find my node
     pos = None
     for i in xrange(len(names)):
@@ -254,8 +408,11 @@ class ADFSDir(ADFSNode):
       prev.block.write()
 
     # remove from my lists
-    self.entries.remove(node)
+    if self.entries != None:
+      self.entries.remove(node)
     names.remove(node)
+    self.dcache_nodes.pop(node.block.blk_num, None)
+    self.volume.invalidate_path_cache(node)
 
     # remove blocks of node in bitmap
     blk_nums = node.get_block_nums()
@@ -263,7 +420,7 @@ class ADFSDir(ADFSNode):
     
     # dircache?
     if self.volume.is_dircache:
-      free_blk_num = self._dircache_remove_entry(node.name.name)
+      free_blk_num = self._dircache_remove_entry(node.name.get_ami_str_name())
     else:
       free_blk_num = None
     
@@ -299,6 +456,16 @@ class ADFSDir(ADFSNode):
     ADFSNode.list(self, indent, all, detail, encoding)
     if not all and indent > 0:
       return
+    # dircache: no need to read the headers of the entries
+    if not detail and self.entries == None:
+      listing = self.get_dircache_listing(with_dirs=all)
+      if listing != None:
+        for stat, node in listing:
+          if node != None:
+            node.list(indent=indent+1, all=all, detail=detail, encoding=encoding)
+          else:
+            print(stat.get_list_str(indent=indent+1).encode(encoding))
+        return
     self.ensure_entries()
     es = self.get_entries_sorted_by_name()
     for e in es:
@@ -307,30 +474,29 @@ class ADFSDir(ADFSNode):
   def get_path(self, pc, allow_file=True, allow_dir=True):
     if len(pc) == 0:
       return self
-    self.ensure_entries()
-    for e in self.entries:
-      if not isinstance(pc[0], FileName):
-        raise ValueError("get_path's pc must be a FileName array")
-      if e.name.get_upper_ami_str() == pc[0].get_upper_ami_str():
-        if len(pc) > 1:
-          if isinstance(e, ADFSDir):
-            return e.get_path(pc[1:], allow_file, allow_dir)
-          else:
-            return None
+    if not isinstance(pc[0], FileName):
+      raise ValueError("get_path's pc must be a FileName array")
+    e = self.find_name(pc[0])
+    if e == None:
+      return None
+    if len(pc) > 1:
+      if isinstance(e, ADFSDir):
+        return e.get_path(pc[1:], allow_file, allow_dir)
+      else:
+        return None
+    else:
+      if isinstance(e, ADFSDir):
+        if allow_dir:
+          return e
         else:
-          if isinstance(e, ADFSDir):
-            if allow_dir:
-              return e
-            else:
-              return None
-          elif isinstance(e, ADFSFile):
-            if allow_file:
-              return e
-            else:
-              return None
-          else:
-            return None
-    return None
+          return None
+      elif isinstance(e, ADFSFile):
+        if allow_file:
+          return e
+        else:
+          return None
+      else:
+        return None
     
   def draw_on_bitmap(self, bm, show_all=False, first=True):
     blk_num = self.block.blk_num
@@ -376,13 +542,15 @@ class ADFSDir(ADFSNode):
 
   # ----- dir cache -----
 
-  def _dircache_add_entry(self, name, meta_info, entry_blk, size, update_myself=True):
+  def _dircache_add_entry(self, name, meta_info, entry_blk, size, sub_type, update_myself=True):
     # create a new dircache record
     r = DirCacheRecord(entry=entry_blk, size=size, protect=meta_info.get_protect(), \
-                       mod_ts=meta_info.get_mod_ts(), sub_type=0, name=name, comment=meta_info.get_comment())
+                       mod_ts=meta_info.get_mod_ts(), sub_type=sub_type, name=name.get_ami_str(), \
+                       comment=meta_info.get_comment_ami_str())
     return self._dircache_add_entry_int(r, update_myself)
     
   def _dircache_add_entry_int(self, r, update_myself=True):
+    self.ensure_dircache()
     r_bytes = r.get_size()
     # find a dircache block with enough space
     found_blk = None
@@ -423,6 +591,7 @@ class ADFSDir(ADFSNode):
     return dcb
     
   def _dircache_remove_entry(self, name, update_myself=True):
+    self.ensure_dircache()
     # first find entry
     pos = None
     dcb = None
@@ -466,6 +635,7 @@ class ADFSDir(ADFSNode):
       return None
     
   def get_dircache_record(self, name):
+    self.ensure_dircache()
     if self.dcache_blks != None:
       for dcb in self.dcache_blks:
         record = dcb.get_record_by_name(name)
@@ -488,6 +658,22 @@ class ADFSDir(ADFSNode):
           break
   
   def get_block_usage(self, all=False, first=True):
+    # dircache: derive usage of files from their size
+    if (all or first) and self.entries == None:
+      listing = self.get_dircache_listing(with_dirs=all)
+      if listing != None:
+        num_data = 0
+        num_non_data = 1 + len(self.dcache_blks)
+        for stat, node in listing:
+          if node != None:
+            bu = node.get_block_usage(all=all, first=False)
+          elif stat.is_dir:
+            bu = (0, 1)
+          else:
+            bu = (calc_num_data_blks(self.volume, stat.size), calc_num_list_blks(self.volume, stat.size) + 1)
+          num_data += bu[0]
+          num_non_data += bu[1]
+        return (num_data, num_non_data)
     num_non_data = 1
     num_data = 0
     if self.dcache_blks != None:
@@ -502,6 +688,15 @@ class ADFSDir(ADFSNode):
   
   def get_file_bytes(self, all=False, first=True):
     size = 0
+    if (all or first) and self.entries == None:
+      listing = self.get_dircache_listing(with_dirs=all)
+      if listing != None:
+        for stat, node in listing:
+          if node != None:
+            size += node.get_file_bytes(all=all, first=False)
+          elif not stat.is_dir:
+            size += stat.size
+        return size
     if all or first:
       self.ensure_entries()
       for e in self.entries:
@@ -2,8 +2,28 @@ from block.FileHeaderBlock import FileHeaderBlock
 from block.FileListBlock import FileListBlock
 from block.FileDataBlock import FileDataBlock
 from ADFSNode import ADFSNode
+from ADFSFileStream import ADFSFileReader, ADFSFileWriter
 from FSError import *
 
+def calc_num_data_blks(volume, size):
+  """how many data blocks are needed to store a file of given size?"""
+  bb = volume.blkdev.block_bytes
+  if not volume.is_ffs:
+    bb -= 24
+  return (size + bb - 1) / bb
+
+def calc_num_list_blks(volume, size):
+  """how many list blocks are needed to store the data blk ptrs of a file?"""
+  db = calc_num_data_blks(volume, size)
+  # ptr per block
+  ppb = volume.blkdev.block_longs - 56
+  # fits in header block?
+  if db <= ppb:
+    return 0
+  else:
+    db -= ppb
+    return (db + ppb - 1) / ppb
+
 class ADFSFile(ADFSNode):
   def __init__(self, volume, parent):
     ADFSNode.__init__(self, volume, parent)
@@ -11,11 +31,13 @@ class ADFSFile(ADFSNode):
     self.ext_blk_nums = []
     self.ext_blks = []
     self.data_blk_nums = []
-    self.data_blks = []
     self.valid = False
     self.data = None
+    self.data_src = None
     self.data_size = 0
     self.total_blks = 0
+    # are the list and data block numbers known?
+    self.blks_loaded = False
   
   def __repr__(self):
     return "[File(%d)'%s':%d]" % (self.block.blk_num, self.block.name, self.block.byte_size)
@@ -28,9 +50,25 @@ class ADFSFile(ADFSNode):
       raise FSError(INVALID_FILE_HEADER_BLOCK, block=anon_blk)
     self.set_block(fhb)
 
-    # retrieve data blocks and size from header
-    self.data_blk_nums = fhb.data_blocks[:]
+    # size is in the header. the block lists are read on demand
     self.data_size = fhb.byte_size
+    self.num_data_blks = self.calc_number_of_data_blks()
+    self.num_ext_blks = self.calc_number_of_list_blks()
+    self.total_blks = 1 + self.num_ext_blks + self.num_data_blks
+    self.blks_loaded = False
+    return fhb
+
+  def ensure_blocks(self):
+    if not self.blks_loaded:
+      self.read_blocks()
+
+  def read_blocks(self):
+    """read the file list blocks and collect the data block numbers"""
+    fhb = self.block
+    self.ext_blk_nums = []
+    self.ext_blks = []
+    # retrieve data blocks from header
+    self.data_blk_nums = fhb.data_blocks[:]
 
     # scan for extension blocks
     next_ext = self.block.extension
@@ -58,50 +96,19 @@ class ADFSFile(ADFSNode):
 
     # calc number of total blocks occupied by this file
     self.total_blks = 1 + my_num_ext_blks + my_num_data_blks
-
-    return fhb
+    self.blks_loaded = True
   
   def read(self):
     """read data blocks"""
-    self.data_blks = []
-    want_seq_num = 1
-    total_size = 0
-    is_ffs = self.volume.is_ffs
-    byte_size = self.block.byte_size
-    data = ""
-    for blk in self.data_blk_nums:
-      if is_ffs:
-        # ffs has raw data blocks
-        dat_blk = self.volume.blkdev.read_block(blk)
-        total_size += len(dat_blk)
-        # shrink last read if necessary
-        if total_size > byte_size:
-          shrink = total_size - byte_size
-          dat_blk = dat_blk[:-shrink]
-          total_size = byte_size
-        data += dat_blk
-      else:
-        # ofs
-        dat_blk = FileDataBlock(self.block.blkdev, blk)
-        dat_blk.read()
-        if not dat_blk.valid:
-          raise FSError(INVALID_FILE_DATA_BLOCK, block=dat_blk, node=self)
-        # check sequence number
-        if dat_blk.seq_num != want_seq_num:
-          raise FSError(INVALID_SEQ_NUM, block=dat_blk, node=self, extra="got=%d wanted=%d" % (dat_blk.seq_num, want_seq_num))
-        # store data blocks
-        self.data_blks.append(dat_blk)
-        total_size += dat_blk.data_size
-        data += dat_blk.get_block_data()
-      want_seq_num += 1
-    # store full contents of file
-    self.data = data
-    # make sure all went well
-    got_size = len(data)
-    want_size = self.block.byte_size
-    if got_size != want_size:
-      raise FSError(INTERNAL_ERROR, block=self.block, node=self, extra="file size mismatch: got=%d want=%d" % (got_size, want_size))
-  
+    reader = self.get_file_reader()
+    self.data = reader.read()
+    reader.close()
+
+  def get_file_reader(self):
+    """return a file-like object to stream the file contents"""
+    self.ensure_blocks()
+    return ADFSFileReader(self)
+
   def get_file_data(self):
     if self.data != None:
       return self.data
@@ -110,7 +117,7 @@ class ADFSFile(ADFSNode):
   
   def flush(self):
     self.data = None
-    self.data_blks = None
+    self.data_src = None
   
   def ensure_data(self):
     if self.data == None:
@@ -121,6 +128,14 @@ class ADFSFile(ADFSNode):
     self.data_size = len(data)
     self.num_data_blks = self.calc_number_of_data_blks()
     self.num_ext_blks = self.calc_number_of_list_blks()
+
+  def set_file_stream(self, fobj, size):
+    """the file contents of given size will be read from fobj on write"""
+    self.data = None
+    self.data_src = fobj
+    self.data_size = size
+    self.num_data_blks = self.calc_number_of_data_blks()
+    self.num_ext_blks = self.calc_number_of_list_blks()
   
   def get_data_block_contents_bytes(self):
     """how many bytes of file data can be stored in a block?"""
@@ -132,21 +147,11 @@ class ADFSFile(ADFSNode):
   
   def calc_number_of_data_blks(self):
     """given the file size: how many data blocks do we need to store the file?"""
-    bb = self.get_data_block_contents_bytes()
-    ds = self.data_size
-    return (ds + bb -1 ) / bb
+    return calc_num_data_blks(self.volume, self.data_size)
   
   def calc_number_of_list_blks(self):
     """given the file size: how many list blocks do we need to store the data blk ptrs?"""
-    db = self.calc_number_of_data_blks()
-    # ptr per block
-    ppb = self.volume.blkdev.block_longs - 56
-    # fits in header block?
-    if db <= ppb:
-      return 0
-    else:
-      db -= ppb
-      return (db + ppb - 1) / ppb 
+    return calc_num_list_blks(self.volume, self.data_size)
   
   def blocks_get_create_num(self):
     # determine number of blocks to create
@@ -170,7 +175,7 @@ class ADFSFile(ADFSNode):
     
     # create file header block
     fhb = FileHeaderBlock(self.blkdev, fhb_num)
-    byte_size = len(self.data)
+    byte_size = self.data_size
     if self.num_data_blks > ppb:
       hdr_blks = self.data_blk_nums[0:ppb]
       hdr_ext = self.ext_blk_nums[0]
@@ -197,6 +202,7 @@ class ADFSFile(ADFSNode):
       self.ext_blks.append(flb)
       ext_off += ppb
     
+    self.blks_loaded = True
     # write data blocks
     self.write()
 
@@ -204,41 +210,22 @@ class ADFSFile(ADFSNode):
     return fhb_num
   
   def write(self):
-    self.data_blks = []
-    off = 0
-    left = self.data_size
-    blk_idx = 0
-    bs = self.get_data_block_contents_bytes()
-    is_ffs = self.volume.is_ffs
-    while off < self.data_size:
-      # number of data block
-      blk_num = self.data_blk_nums[blk_idx]
-      # extract file data
-      size = left
-      if size > bs:
-        size = bs
-      d = self.data[off:off+size]
-      if is_ffs:
-        # pad block
-        if size < bs:
-          d += '\0' * (bs-size)
-        # write raw block data in FFS
-        self.blkdev.write_block(blk_num, d)
-      else:
-        # old FS: create and write data block
-        fdb = FileDataBlock(self.blkdev, blk_num)
-        if blk_idx == self.num_data_blks - 1:
-          next_data = 0
-        else:
-          next_data = self.data_blk_nums[blk_idx+1]
-        fdb.create(self.block.blk_num, blk_idx+1, d, next_data)
-        fdb.write()
-        self.data_blks.append(fdb)
-      blk_idx += 1
-      off += bs
-      left -= bs
-  
+    writer = ADFSFileWriter(self)
+    if self.data != None:
+      writer.write(self.data)
+    else:
+      # copy from stream
+      left = self.data_size
+      while left > 0:
+        d = self.data_src.read(min(left, 0x10000))
+        if len(d) == 0:
+          break
+        writer.write(d)
+        left -= len(d)
+    writer.close()
+
   def draw_on_bitmap(self, bm, show_all=False, first=False):
+    self.ensure_blocks()
     bm[self.block.blk_num] = 'H'
     for b in self.ext_blk_nums:
       bm[b] = 'E'
@@ -246,17 +233,22 @@ class ADFSFile(ADFSNode):
       bm[b] = 'd'
 
   def get_block_nums(self):
+    self.ensure_blocks()
     result = [self.block.blk_num]
     result += self.ext_blk_nums
     result += self.data_blk_nums
     return result
   
   def get_blocks(self, with_data=True):
+    self.ensure_blocks()
     result = [self.block]
     result += self.ext_blks
-    if with_data:
-      self.ensure_data()
-      result += self.data_blks
+    # only ofs has data blocks with a structure
+    if with_data and not self.volume.is_ffs:
+      for blk_num in self.data_blk_nums:
+        dat_blk = FileDataBlock(self.blkdev, blk_num)
+        dat_blk.read()
+        result.append(dat_blk)
     return result
   
   def can_delete(self):
@@ -269,10 +261,15 @@ class ADFSFile(ADFSNode):
     return "%8d" % self.data_size
 
   def get_detail_str(self):
+    self.ensure_blocks()
     return "data=%d ext=%d" % (len(self.data_blk_nums), len(self.ext_blk_nums)) 
 
   def get_block_usage(self, all=False, first=True):
-    return (len(self.data_blk_nums), len(self.ext_blk_nums) + 1)
+    # derived from the size if the block lists were not read yet
+    if self.blks_loaded:
+      return (len(self.data_blk_nums), len(self.ext_blk_nums) + 1)
+    else:
+      return (self.num_data_blks, self.num_ext_blks + 1)
 
   def get_file_bytes(self, all=False, first=True):
     return self.data_size
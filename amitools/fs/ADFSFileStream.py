@@ -0,0 +1,190 @@
+import struct
+
+from block.Block import Block
+from block.FileDataBlock import FileDataBlock
+import block.Checksum as Checksum
+from FSError import *
+
+# longest run of consecutive data blocks transferred in one device access
+max_run_blks = 128
+
+def get_block_runs(blk_nums, max_run=max_run_blks):
+  """split a list of block numbers into (first_blk, num) runs of
+     consecutive blocks"""
+  runs = []
+  start = None
+  num = 0
+  for b in blk_nums:
+    if start != None and b == start + num and num < max_run:
+      num += 1
+    else:
+      if start != None:
+        runs.append((start, num))
+      start = b
+      num = 1
+  if start != None:
+    runs.append((start, num))
+  return runs
+
+class ADFSFileReader:
+  """a file-like object reading the contents of an ADFSFile.
+
+     Runs of consecutive data blocks are read with a single device call
+     and only a run at a time is kept in memory.
+  """
+  def __init__(self, node):
+    self.node = node
+    self.blkdev = node.blkdev
+    self.byte_size = node.block.byte_size
+    self.is_ffs = node.volume.is_ffs
+    self.chunks = self._read_chunks()
+    self.buf = bytearray()
+    self.pos = 0
+
+  def _read_chunks(self):
+    """generate the file contents in chunks of one block run"""
+    bb = self.blkdev.block_bytes
+    bl = self.blkdev.block_longs
+    left = self.byte_size
+    want_seq_num = 1
+    for first_blk, num in get_block_runs(self.node.data_blk_nums):
+      data = self.blkdev.read_blocks(first_blk, num)
+      if self.is_ffs:
+        # ffs has raw data blocks
+        if len(data) > left:
+          data = data[:left]
+        left -= len(data)
+        yield data
+      else:
+        # ofs: strip the headers of the data blocks. all blocks of the run
+        # are decoded to longs at once to check headers and checksums
+        longs = Checksum.get_block_longs(data, bl)
+        chunk = bytearray()
+        for i in xrange(num):
+          off = i * bb
+          lo = i * bl
+          blk_type = longs[lo]
+          seq_num = longs[lo + 2] & 0xffffffff
+          data_size = longs[lo + 3] & 0xffffffff
+          if blk_type != Block.T_DATA or sum(longs[lo:lo + bl]) & 0xffffffff != 0 \
+             or data_size > bb - 24:
+            # decode block for error report
+            dat_blk = FileDataBlock(self.blkdev, first_blk + i)
+            raise FSError(INVALID_FILE_DATA_BLOCK, block=dat_blk, node=self.node)
+          # check sequence number
+          if seq_num != want_seq_num:
+            dat_blk = FileDataBlock(self.blkdev, first_blk + i)
+            raise FSError(INVALID_SEQ_NUM, block=dat_blk, node=self.node, extra="got=%d wanted=%d" % (seq_num, want_seq_num))
+          want_seq_num += 1
+          chunk += data[off+24:off+24+data_size]
+        left -= len(chunk)
+        yield str(chunk)
+    # make sure all went well
+    if left != 0:
+      raise FSError(INTERNAL_ERROR, block=self.node.block, node=self.node, extra="file size mismatch: got=%d want=%d" % (self.byte_size - left, self.byte_size))
+
+  def read(self, size=-1):
+    """read up to size bytes or all remaining bytes if size is negative"""
+    buf = self.buf
+    while size < 0 or len(buf) < size:
+      chunk = next(self.chunks, None)
+      if chunk == None:
+        break
+      buf += chunk
+    if size < 0 or size >= len(buf):
+      result = str(buf)
+      self.buf = bytearray()
+    else:
+      result = str(buf[:size])
+      del buf[:size]
+    self.pos += len(result)
+    return result
+
+  def tell(self):
+    return self.pos
+
+  def close(self):
+    self.chunks = None
+    self.buf = bytearray()
+
+class ADFSFileWriter:
+  """a file-like object writing the contents of an ADFSFile whose blocks
+     are already allocated.
+
+     File data is collected until a run of consecutive blocks can be filled.
+     Then all blocks of the run are built at once and written with a single
+     device call.
+  """
+  def __init__(self, node):
+    self.node = node
+    self.blkdev = node.blkdev
+    self.is_ffs = node.volume.is_ffs
+    self.data_size = node.data_size
+    self.blk_bytes = node.get_data_block_contents_bytes()
+    self.blk_nums = node.data_blk_nums
+    self.runs = get_block_runs(self.blk_nums)
+    self.run_idx = 0
+    self.blk_idx = 0
+    # pending file data not yet filling a run
+    self.buf = bytearray()
+    self.pos = 0
+
+  def write(self, data):
+    if self.pos + len(data) > self.data_size:
+      raise FSError(INTERNAL_ERROR, node=self.node, extra="file size exceeded: want=%d" % self.data_size)
+    self.pos += len(data)
+    buf = self.buf
+    buf += data
+    off = 0
+    while self.run_idx < len(self.runs):
+      size = self.runs[self.run_idx][1] * self.blk_bytes
+      if len(buf) - off < size:
+        break
+      self._write_run(buffer(buf, off, size))
+      off += size
+    if off > 0:
+      del buf[:off]
+
+  def _write_run(self, data):
+    """build and write the blocks of the next run from its file data"""
+    first_blk, num = self.runs[self.run_idx]
+    bb = self.blkdev.block_bytes
+    if self.is_ffs:
+      # ffs: data blocks hold raw data. pad last block
+      run = bytearray(data)
+      if len(run) < num * bb:
+        run += '\0' * (num * bb - len(run))
+    else:
+      # ofs: build data blocks with headers and checksums
+      run = bytearray(num * bb)
+      cb = self.blk_bytes
+      hdr_key = self.node.block.blk_num
+      last_idx = len(self.blk_nums) - 1
+      for i in xrange(num):
+        idx = self.blk_idx + i
+        if idx == last_idx:
+          next_data = 0
+        else:
+          next_data = self.blk_nums[idx + 1]
+        chunk = data[i * cb:(i + 1) * cb]
+        off = i * bb
+        struct.pack_into(">IIIII", run, off, Block.T_DATA, hdr_key, idx + 1, len(chunk), next_data)
+        run[off + 24:off + 24 + len(chunk)] = chunk
+      # checksum field is still zero: calc all checksums in one go
+      chksums = Checksum.calc_chksums(run, self.blkdev.block_longs, 5)
+      for i in xrange(num):
+        struct.pack_into(">I", run, i * bb + 20, chksums[i])
+    self.blkdev.write_blocks(first_blk, run)
+    self.blk_idx += num
+    self.run_idx += 1
+
+  def tell(self):
+    return self.pos
+
+  def close(self):
+    """write the last partial run and check that all data was written"""
+    if len(self.buf) > 0 and self.run_idx < len(self.runs):
+      self._write_run(buffer(self.buf))
+    self.buf = bytearray()
+    if self.pos != self.data_size or self.blk_idx != len(self.blk_nums):
+      raise FSError(INTERNAL_ERROR, node=self.node, extra="file size mismatch: got=%d want=%d" % (self.pos, self.data_size))
@@ -4,6 +4,7 @@ from ProtectFlags import ProtectFlags
 from TimeStamp import TimeStamp
 from FSError import *
 from FSString import FSString
+from ADFSStat import ADFSStat
 import amitools.util.ByteSize as ByteSize
 
 class ADFSNode:
@@ -43,6 +44,9 @@ class ADFSNode:
   def get_meta_info(self):
     return self.meta_info
 
+  def get_stat(self):
+    return ADFSStat(self.name, self.get_size(), self.meta_info, self.block.blk_num, self.is_dir())
+
   def change_meta_info(self, meta_info):
     dirty = False
 
@@ -80,7 +84,7 @@ class ADFSNode:
       self.meta_info.set_comment(comment)
       dirty = True
       if record != None:
-        rebuild_dircache = len(record.comment) < comment 
+        rebuild_dircache = len(record.comment) < len(comment.get_ami_str())
         record.comment = comment.get_ami_str()
     
     # really need update?
@@ -0,0 +1,26 @@
+class ADFSStat:
+  """name, size and meta info of a directory entry.
+
+     It is either taken from the header block of a node or from a
+     dircache record of its parent directory.
+  """
+  def __init__(self, name, size, meta_info, blk_num, is_dir):
+    self.name = name
+    self.size = size
+    self.meta_info = meta_info
+    self.blk_num = blk_num
+    self.is_dir = is_dir
+
+  def __repr__(self):
+    return "[Stat(%d)'%s':%d]" % (self.blk_num, self.name.get_ami_str_name(), self.size)
+
+  def get_size_str(self):
+    if self.is_dir:
+      return "DIR"
+    else:
+      return "%8d" % self.size
+
+  def get_list_str(self, indent=0):
+    istr = u'  ' * indent
+    extra = self.meta_info.get_str_line()
+    return u'%-40s       %8s  %s' % (istr + self.name.get_unicode_name(), self.get_size_str(), extra)
@@ -6,7 +6,6 @@ class ADFSVolDir(ADFSDir):
   def __init__(self, volume, root_block):
     ADFSDir.__init__(self, volume, None)
     self.set_block(root_block)
-    self._init_name_hash()
   
   def __repr__(self):
     return "[VolDir(%d)'%s':%s]" % (self.block.blk_num, self.block.name, self.entries)
@@ -26,6 +26,8 @@ class ADFSVolume:
     self.is_dircache = None
     self.name = None
     self.meta_info = None
+    # upper case path -> node of already resolved paths
+    self.path_cache = {}
     
   def open(self):
     # read boot block
@@ -45,9 +47,8 @@ class ADFSVolume:
         self.name = FSString(self.root.name)
         # build meta info
         self.meta_info = RootMetaInfo( self.root.create_ts, self.root.disk_ts, self.root.mod_ts )
-        # create root dir
+        # create root dir. its entries are read on demand
         self.root_dir = ADFSVolDir(self, self.root)
-        self.root_dir.read()
         # create bitmap
         self.bitmap = ADFSBitmap(self.root)
         self.bitmap.read()
@@ -141,8 +142,78 @@ class ADFSVolume:
       return self.root_dir
     else:
       # find a sub node
-      path = fn.split_path()
-      return self.root_dir.get_path(path, allow_file, allow_dir)
+      node = self._find_path(fn.split_path())
+      if node == None:
+        return None
+      elif node.is_dir():
+        if allow_dir:
+          return node
+      elif node.is_file():
+        if allow_file:
+          return node
+      return None
+
+  def _find_path(self, pc):
+    """resolve the path components with the help of the path cache"""
+    cache = self.path_cache
+    node = self.root_dir
+    key = None
+    for c in pc:
+      up = c.get_upper_ami_str()
+      if key == None:
+        key = up
+      else:
+        key = key + "/" + up
+      sub = cache.get(key)
+      if sub == None:
+        if not node.is_dir():
+          return None
+        sub = node.find_name(c)
+        if sub == None:
+          return None
+        cache[key] = sub
+      node = sub
+    return node
+
+  def _get_path_key(self, node):
+    pc = []
+    while node.parent != None:
+      pc.append(node.name.get_upper_ami_str())
+      node = node.parent
+    pc.reverse()
+    return "/".join(pc)
+
+  def invalidate_path_cache(self, node, with_node=True):
+    """drop the cached paths of a node and all nodes below it"""
+    cache = self.path_cache
+    if len(cache) == 0:
+      return
+    if node.parent == None:
+      cache.clear()
+      return
+    key = self._get_path_key(node)
+    if with_node and cache.has_key(key):
+      del cache[key]
+    prefix = key + "/"
+    for k in cache.keys():
+      if k.startswith(prefix):
+        del cache[k]
+
+  def get_path_stat(self, path_name):
+    """get an ADFSStat for given path. on dircache volumes it is taken
+       from the dircache of the parent dir without reading the header"""
+    if not isinstance(path_name, FSString):
+      raise ValueError("get_path_stat's path must be a FSString")
+    fn = FileName(path_name, is_intl=self.is_intl)
+    if not fn.is_valid():
+      raise FSError(INVALID_FILE_NAME, file_name=path_name, node=self)
+    if fn.is_root_path_alias():
+      return self.root_dir.get_stat()
+    pc = fn.split_path()
+    parent = self._find_path(pc[:-1])
+    if parent == None or not parent.is_dir():
+      return None
+    return parent.stat_name(pc[-1])
 
   def get_dir_path_name(self, path_name):
     """get node for given path and ensure its a directory"""
@@ -2,6 +2,8 @@ import os
 import os.path
 import sys
 import unicodedata
+import threading
+import Queue
 
 from ADFSDir import ADFSDir
 from ADFSFile import ADFSFile
@@ -15,10 +17,17 @@ import amitools.util.KeyValue as KeyValue
 from FSString import FSString
 
 class Imager:
-  def __init__(self, path_encoding=None):
+  # size of the chunks file contents are copied with
+  copy_size = 0x100000
+
+  def __init__(self, path_encoding=None, num_writers=0):
     self.meta_db = None
     self.total_bytes = 0
     self.path_encoding = path_encoding
+    # unpack: number of threads writing the host files (0=serial)
+    self.num_writers = num_writers
+    self.write_queue = None
+    self.write_error = None
     # get path name encoding for host file system
     if self.path_encoding == None:
       self.path_encoding = sys.getfilesystemencoding()
@@ -83,7 +92,56 @@ class Imager:
     f.close()
     
   def unpack_root(self, volume, vol_path):
-    self.unpack_dir(volume.get_root_dir(), vol_path)
+    if self.num_writers > 0:
+      self.unpack_root_pipelined(volume, vol_path)
+    else:
+      self.unpack_dir(volume.get_root_dir(), vol_path)
+
+  def unpack_root_pipelined(self, volume, vol_path):
+    """the calling thread walks the volume and decodes the file data while
+       a pool of writer threads stores the host files. as only the calling
+       thread touches the volume and the meta db the result is the same as
+       in a serial run.
+    """
+    self.write_queue = Queue.Queue(self.num_writers * 4)
+    self.write_error = None
+    writers = []
+    for i in xrange(self.num_writers):
+      t = threading.Thread(target=self._writer_main)
+      t.daemon = True
+      t.start()
+      writers.append(t)
+    try:
+      self.unpack_dir(volume.get_root_dir(), vol_path)
+    finally:
+      for t in writers:
+        self.write_queue.put(None)
+      for t in writers:
+        t.join()
+      self.write_queue = None
+    if self.write_error != None:
+      raise self.write_error
+
+  def _writer_main(self):
+    while True:
+      job = self.write_queue.get()
+      if job == None:
+        break
+      # after an error only drain the queue
+      if self.write_error != None:
+        continue
+      try:
+        self.write_host_file(*job)
+      except Exception, e:
+        # keep the first error. a dead writer would block the reader
+        if self.write_error == None:
+          self.write_error = e
+
+  def write_host_file(self, file_path, data, mod_secs):
+    fh = open(file_path, "wb")
+    fh.write(data)
+    fh.close()
+    os.utime(file_path, (mod_secs, mod_secs))
   
   def unpack_dir(self, dir, path):
     if not os.path.exists(path):
@@ -107,13 +165,30 @@ class Imager:
       node.flush()
     # file
     elif node.is_file():
-      data = node.get_file_data()
-      node.flush()
       file_path = os.path.join(path, self.to_path_str(name))
+      mod_secs = node.meta_info.get_mod_ts().get_secsf()
+      size = node.get_file_bytes()
+      # hand over smaller files to the writer threads
+      if self.write_queue != None and size <= self.copy_size:
+        if self.write_error != None:
+          raise self.write_error
+        data = node.get_file_data()
+        node.flush()
+        self.write_queue.put((file_path, data, mod_secs))
+        self.total_bytes += size
+        return
+      reader = node.get_file_reader()
       fh = open(file_path, "wb")
-      fh.write(data)
+      while True:
+        data = reader.read(self.copy_size)
+        if len(data) == 0:
+          break
+        fh.write(data)
       fh.close()
-      self.total_bytes += len(data)
+      reader.close()
+      node.flush()
+      os.utime(file_path, (mod_secs, mod_secs))
+      self.total_bytes += size
   
   # ----- pack -----
   
@@ -217,10 +292,10 @@ class Imager:
       node.flush()
     # pack file
     elif os.path.isfile(in_path):
-      # read file
+      # stream file
+      size = os.path.getsize(in_path)
       fh = open(in_path, "rb")
-      data = fh.read()
+      node = parent_node.create_file_stream(FSString(ami_name), fh, size, meta_info, False)
       fh.close()
-      node = parent_node.create_file(FSString(ami_name), data, meta_info, False)
       node.flush()
-      self.total_bytes += len(data)
+      self.total_bytes += size
@@ -1,18 +1,38 @@
+import time
+
 from ADFSVolume import ADFSVolume
 from amitools.fs.blkdev.BlkDevFactory import BlkDevFactory
+import amitools.util.ByteSize as ByteSize
 
 class Repacker:
-  def __init__(self, in_image_file, in_options=None):
+  """copy all files and dirs of a volume into a new volume.
+
+     File contents are streamed as runs of data blocks from the input to
+     the output device. Only headers, list blocks and the bitmap of the
+     output volume are created anew.
+  """
+  def __init__(self, in_image_file, in_options=None, cache_size=0, dos_type=None, progress=None):
     self.in_image_file = in_image_file
     self.in_options = in_options
+    self.cache_size = cache_size
+    # dos type of output volume. None=same as input
+    self.dos_type = dos_type
+    # progress(repacker) is called after each file
+    self.progress = progress
     self.in_blkdev = None
     self.out_blkdev = None
     self.in_volume = None
     self.out_volume = None
+    # statistics
+    self.num_dirs = 0
+    self.num_files = 0
+    self.num_bytes = 0
+    self.start_time = None
+    self.end_time = None
   
   def create_in_blkdev(self):
     f = BlkDevFactory()
-    self.in_blkdev = f.open(self.in_image_file, read_only=True, options=self.in_options)
+    self.in_blkdev = f.open(self.in_image_file, read_only=True, options=self.in_options, cache_size=self.cache_size)
     return self.in_blkdev  
       
   def create_in_volume(self):
@@ -36,7 +56,7 @@ class Repacker:
     if options == None:
       options = self.in_blkdev.get_chs_dict()
     f = BlkDevFactory()
-    self.out_blkdev = f.create(image_file, force=force, options=options)
+    self.out_blkdev = f.create(image_file, force=force, options=options, cache_size=self.cache_size)
     return self.out_blkdev
   
   def create_out_volume(self, blkdev=None):
@@ -49,7 +69,9 @@ class Repacker:
     # clone input volume
     iv = self.in_volume
     name = iv.get_volume_name()
-    dos_type = iv.get_dos_type()
+    dos_type = self.dos_type
+    if dos_type == None:
+      dos_type = iv.get_dos_type()
     meta_info = iv.get_meta_info()
     boot_code = iv.get_boot_code()
     self.out_volume = ADFSVolume(self.out_blkdev)
@@ -57,7 +79,10 @@ class Repacker:
     return self.out_volume
     
   def repack(self):
+    self.start_time = time.time()
+    self.end_time = None
     self.repack_node_dir(self.in_volume.get_root_dir(), self.out_volume.get_root_dir())
+    self.end_time = time.time()
   
   def repack_node_dir(self, in_root, out_root):
     entries = in_root.get_entries()
@@ -73,11 +98,35 @@ class Repacker:
       for child in in_node.get_entries():
         self.repack_node(child, sub_dir)
       sub_dir.flush()
+      self.num_dirs += 1
     # file
     elif in_node.is_file():
-      data = in_node.get_file_data()
-      out_file = out_dir.create_file(name, data, meta_info, False)
+      size = in_node.get_file_bytes()
+      reader = in_node.get_file_reader()
+      out_file = out_dir.create_file_stream(name, reader, size, meta_info, False)
+      reader.close()
       out_file.flush()
+      self.num_files += 1
+      self.num_bytes += size
+      if self.progress != None:
+        self.progress(self)
     in_node.flush()
 
+  def get_elapsed_time(self):
+    if self.start_time == None:
+      return 0.0
+    elif self.end_time == None:
+      return time.time() - self.start_time
+    else:
+      return self.end_time - self.start_time
+
+  def get_stats_str(self):
+    t = self.get_elapsed_time()
+    if t > 0:
+      rate = int(self.num_bytes / t)
+    else:
+      rate = 0
+    return "repack: dirs=%d files=%d bytes=%d time=%.2fs rate=%s/s" % \
+      (self.num_dirs, self.num_files, self.num_bytes, t, ByteSize.to_byte_size_str(rate))
+
       
@@ -1,62 +1,114 @@
 from BlockDevice import BlockDevice
-import ctypes
+from ImageFile import ImageFile
 import gzip
+import struct
+import zlib
 
 class ADFBlockDevice(BlockDevice):
+  """block device of a floppy disk image.
+
+     Plain .adf files are memory mapped: blocks are read from the mapping
+     and only written blocks are synced back to the file on flush.
+     Compressed .adz/.adf.gz images are decompressed chunk by chunk into a
+     single bytearray and are rewritten on flush if a block was written.
+  """
+  # size of compressed data read at once
+  gzip_chunk_bytes = 64 * 1024
+
   def __init__(self, adf_file, read_only=False):
     self.adf_file = adf_file
     self.read_only = read_only
-    self.dirty = False
     lo = adf_file.lower()
     self.gzipped = lo.endswith('.adz') or lo.endswith('.adf.gz')
+    self.img_file = None
+    self.data = None
+    # blocks written since the last flush
+    self.dirty_blks = set()
 
   def create(self):
     if self.read_only:
-      raise IOError("ADF creation not allowed in read-only mode!")    
+      raise IOError("ADF creation not allowed in read-only mode!")
     self._set_geometry() # set default geometry
-    # allocate image in memory
-    self.data = ctypes.create_string_buffer(self.num_bytes)
-    self.dirty = True
+    if self.gzipped:
+      # allocate image in memory. all blocks need to be written
+      self.data = bytearray(self.num_bytes)
+      self.dirty_blks.update(xrange(self.num_blocks))
+    else:
+      # create empty image file and map it
+      self.img_file = ImageFile(self.adf_file, False, self.block_bytes, use_mmap=True)
+      self.img_file.create(self.num_blocks)
+      self.img_file.open()
 
   def open(self):
     self._set_geometry() # set default geometry
-    # open adf file 
     if self.gzipped:
-      fh = gzip.open(self.adf_file,"rb")
+      self.data = self._read_gzip()
     else:
-      fh = file(self.adf_file, "rb")
-    data = fh.read(self.num_bytes)
-    fh.close()
+      self.img_file = ImageFile(self.adf_file, self.read_only, self.block_bytes, use_mmap=True)
+      self.img_file.open()
+      # check size
+      size = self.img_file.size
+      if size < self.num_bytes:
+        self.img_file.close()
+        self.img_file = None
+        raise IOError("Invalid ADF Size: got %d but expected %d" % (size, self.num_bytes))
+
+  def _read_gzip(self):
+    """decompress the image file chunk by chunk into a bytearray.
+       the whole stream is read so that the gzip trailer (crc and size)
+       is checked
+    """
+    num_bytes = self.num_bytes
+    data = bytearray(num_bytes)
+    pos = 0
+    fh = gzip.open(self.adf_file, "rb")
+    try:
+      while pos < num_bytes:
+        chunk = fh.read(min(self.gzip_chunk_bytes, num_bytes - pos))
+        if chunk == "":
+          break
+        data[pos:pos+len(chunk)] = chunk
+        pos += len(chunk)
+      # reading past the image runs into the trailer check
+      extra = fh.read(1)
+    except (IOError, EOFError, zlib.error, struct.error), e:
+      raise IOError("Invalid ADF gzip data: %s" % e)
+    finally:
+      fh.close()
     # check size
-    if len(data) != self.num_bytes:
-      raise IOError("Invalid ADF Size: got %d but expected %d" % (len(data), self.num_bytes))
-    # create modifyable data
-    if self.read_only:
-      self.data = data
-    else:
-      self.data = ctypes.create_string_buffer(data)
-      
+    if pos != num_bytes:
+      raise IOError("Invalid ADF Size: got %d but expected %d" % (pos, num_bytes))
+    if extra != "":
+      raise IOError("Invalid ADF Size: gzip data exceeds %d bytes" % num_bytes)
+    return data
+
   def flush(self):
-    # write dirty adf
-    if self.dirty and not self.read_only:
-      if self.gzipped:
-        fh = gzip.open(self.adf_file,"wb")
-      else:
-        fh = file(self.adf_file, "wb")
-      fh.write(self.data[:self.num_bytes])
+    # write back dirty blocks
+    if len(self.dirty_blks) == 0 or self.read_only:
+      return
+    if self.img_file != None:
+      self.img_file.flush()
+    else:
+      fh = gzip.open(self.adf_file,"wb")
+      fh.write(buffer(self.data))
       fh.close()
-      self.dirty = False
-        
+    self.dirty_blks.clear()
+
   def close(self):
     self.flush()
+    if self.img_file != None:
+      self.img_file.close()
+      self.img_file = None
     self.data = None
 
   def read_block(self, blk_num):
     if blk_num >= self.num_blocks:
       raise ValueError("Invalid ADF block num: got %d but max is %d" % (blk_num, self.num_blocks))
+    if self.img_file != None:
+      return self.img_file.read_blk(blk_num)
     off = self._blk_to_offset(blk_num)
-    return self.data[off:off+self.block_bytes]
-  
+    return str(buffer(self.data, off, self.block_bytes))
+
   def write_block(self, blk_num, data):
     if self.read_only:
       raise IOError("ADF File is read-only!")
@@ -64,6 +116,32 @@ class ADFBlockDevice(BlockDevice):
       raise ValueError("Invalid ADF block num: got %d but max is %d" % (blk_num, self.num_blocks))
     if len(data) != self.block_bytes:
       raise ValueError("Invalid ADF block size written: got %d but size is %d" % (len(data), self.block_bytes))
+    if self.img_file != None:
+      self.img_file.write_blk(blk_num, data)
+    else:
+      off = self._blk_to_offset(blk_num)
+      self.data[off:off+self.block_bytes] = data
+    self.dirty_blks.add(blk_num)
+
+  def read_blocks(self, blk_num, num):
+    if blk_num + num > self.num_blocks:
+      raise ValueError("Invalid ADF block num: got %d but max is %d" % (blk_num + num - 1, self.num_blocks))
+    if self.img_file != None:
+      return self.img_file.read_blks(blk_num, num)
     off = self._blk_to_offset(blk_num)
-    self.data[off:off+self.block_bytes] = data
-    self.dirty = True
+    return str(buffer(self.data, off, num*self.block_bytes))
+
+  def write_blocks(self, blk_num, data):
+    if self.read_only:
+      raise IOError("ADF File is read-only!")
+    if len(data) % self.block_bytes != 0:
+      raise ValueError("Invalid ADF block size written: got %d but size is %d" % (len(data), self.block_bytes))
+    num = len(data) / self.block_bytes
+    if blk_num + num > self.num_blocks:
+      raise ValueError("Invalid ADF block num: got %d but max is %d" % (blk_num + num - 1, self.num_blocks))
+    if self.img_file != None:
+      self.img_file.write_blks(blk_num, data)
+    else:
+      off = self._blk_to_offset(blk_num)
+      self.data[off:off+len(data)] = data
+    self.dirty_blks.update(xrange(blk_num, blk_num + num))
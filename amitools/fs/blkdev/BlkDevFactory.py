@@ -5,6 +5,7 @@ import struct
 from ADFBlockDevice import ADFBlockDevice
 from HDFBlockDevice import HDFBlockDevice
 from RawBlockDevice import RawBlockDevice
+from CacheBlockDevice import CacheBlockDevice
 from DiskGeometry import DiskGeometry
 from amitools.fs.rdb.RDisk import RDisk
 import amitools.util.BlkDevTools as BlkDevTools
@@ -69,8 +70,10 @@ class BlkDevFactory:
     else:
       return None
     
-  def open(self, img_file, read_only=False, options=None):
-    """open an existing image file"""
+  def open(self, img_file, read_only=False, options=None, cache_size=0):
+    """open an existing image file.
+       if cache_size is given then the device is wrapped in a block cache
+    """
     # make sure image file exists
     if not os.path.exists(img_file):
       raise IOError("image file not found")
@@ -120,9 +123,11 @@ class BlkDevFactory:
         raise IOError("can't find partition in image file")
       blkdev = part.create_blkdev(True) # auto_close rdisk
       blkdev.open()
+    if cache_size > 0:
+      blkdev = CacheBlockDevice(blkdev, cache_size, read_only)
     return blkdev
 
-  def create(self, img_file, force=True, options=None):
+  def create(self, img_file, force=True, options=None, cache_size=0):
     # make sure we are allowed to overwrite existing file
     if os.path.exists(img_file):
       if not force:
@@ -147,4 +152,6 @@ class BlkDevFactory:
         raise IOError("can't determine geometry of HDF image file")
       blkdev = HDFBlockDevice(img_file)
       blkdev.create(geo)
+    if cache_size > 0:
+      blkdev = CacheBlockDevice(blkdev, cache_size)
     return blkdev
\ No newline at end of file
@@ -40,6 +40,14 @@ class BlockDevice:
     pass
   def write_block(self, blk_num, data):
     pass
+  def read_blocks(self, blk_num, num):
+    """read num consecutive blocks. devices may override it with a single access"""
+    return "".join([self.read_block(blk_num + i) for i in xrange(num)])
+  def write_blocks(self, blk_num, data):
+    """write consecutive blocks given in data"""
+    bb = self.block_bytes
+    for i in xrange(len(data) / bb):
+      self.write_block(blk_num + i, data[i*bb:(i+1)*bb])
   def get_geometry(self):
     return DiskGeometry(self.cyls, self.heads, self.sectors)
   def get_chs_str(self):
@@ -0,0 +1,117 @@
+from BlockDevice import BlockDevice
+import collections
+
+class CacheBlockDevice(BlockDevice):
+  """a block device that keeps the recently used blocks of another block
+     device in memory.
+
+     Up to cache_size blocks are kept. If the cache is full then the least
+     recently used block is evicted. Written blocks are only marked dirty
+     and are written back to the device on eviction or flush().
+  """
+  def __init__(self, blkdev, cache_size=1024, read_only=False):
+    self.blkdev = blkdev
+    self.cache_size = cache_size
+    self.read_only = read_only
+    # blk_num -> data in LRU order: the last entry is the most recent one
+    self.cache = collections.OrderedDict()
+    self.dirty = set()
+    # statistics
+    self.hits = 0
+    self.misses = 0
+    self.write_backs = 0
+    self.evictions = 0
+    self._copy_geometry()
+
+  def __getattr__(self, name):
+    # pass all other attributes through to the cached device
+    return getattr(self.blkdev, name)
+
+  def _copy_geometry(self):
+    b = self.blkdev
+    self.cyls = b.cyls
+    self.heads = b.heads
+    self.sectors = b.sectors
+    self.block_bytes = b.block_bytes
+    self.reserved = b.reserved
+    self.bootblocks = b.bootblocks
+    self.num_tracks = b.num_tracks
+    self.num_blocks = b.num_blocks
+    self.num_bytes = b.num_bytes
+    self.block_longs = b.block_longs
+    self.num_longs = b.num_longs
+
+  def _insert(self, blk_num, data):
+    self.cache[blk_num] = data
+    while len(self.cache) > self.cache_size:
+      old_num, old_data = self.cache.popitem(last=False)
+      if old_num in self.dirty:
+        self.dirty.remove(old_num)
+        self.blkdev.write_block(old_num, old_data)
+        self.write_backs += 1
+      self.evictions += 1
+
+  def read_block(self, blk_num):
+    data = self.cache.pop(blk_num, None)
+    if data != None:
+      self.hits += 1
+      self.cache[blk_num] = data
+      return data
+    self.misses += 1
+    data = self.blkdev.read_block(blk_num)
+    self._insert(blk_num, data)
+    return data
+
+  def write_block(self, blk_num, data):
+    if self.read_only:
+      raise IOError("Can't write block: cached device is read-only")
+    if blk_num >= self.num_blocks:
+      raise ValueError("Invalid Cache block num: got %d but max is %d" % (blk_num, self.num_blocks))
+    if len(data) != self.block_bytes:
+      raise ValueError("Invalid Cache block size written: got %d but size is %d" % (len(data), self.block_bytes))
+    # keep an immutable copy as the caller may reuse its buffer
+    if not isinstance(data, str):
+      data = str(buffer(data))
+    self.cache.pop(blk_num, None)
+    self.dirty.add(blk_num)
+    self._insert(blk_num, data)
+
+  def read_blocks(self, blk_num, num):
+    # bulk reads of uncached blocks bypass the cache
+    cache = self.cache
+    for i in xrange(num):
+      if blk_num + i in cache:
+        return "".join([self.read_block(blk_num + i) for i in xrange(num)])
+    self.misses += num
+    return self.blkdev.read_blocks(blk_num, num)
+
+  def write_blocks(self, blk_num, data):
+    if self.read_only:
+      raise IOError("Can't write block: cached device is read-only")
+    # bulk writes go directly to the device and replace cached copies
+    for i in xrange(len(data) / self.block_bytes):
+      if self.cache.pop(blk_num + i, None) != None:
+        self.dirty.discard(blk_num + i)
+    self.blkdev.write_blocks(blk_num, data)
+
+  def flush(self):
+    # write back dirty blocks in device order
+    for blk_num in sorted(self.dirty):
+      self.blkdev.write_block(blk_num, self.cache[blk_num])
+      self.write_backs += 1
+    self.dirty.clear()
+    self.blkdev.flush()
+
+  def close(self):
+    self.flush()
+    self.cache.clear()
+    self.blkdev.close()
+
+  def get_stats_str(self):
+    total = self.hits + self.misses
+    if total > 0:
+      ratio = self.hits * 100.0 / total
+    else:
+      ratio = 0.0
+    return "cache: hits=%d misses=%d (%.1f%% hits) write_backs=%d evictions=%d" % \
+      (self.hits, self.misses, ratio, self.write_backs, self.evictions)
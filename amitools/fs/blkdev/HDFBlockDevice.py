@@ -6,7 +6,7 @@ import os
 
 class HDFBlockDevice(BlockDevice):
   def __init__(self, hdf_file, read_only=False, block_size=512):
-    self.img_file = ImageFile(hdf_file, read_only, block_size)
+    self.img_file = ImageFile(hdf_file, read_only, block_size, use_mmap=True)
 
   def create(self, geo, reserved=2):
     self._set_geometry(geo.cyls, geo.heads, geo.secs, reserved=reserved)
@@ -18,7 +18,7 @@ class HDFBlockDevice(BlockDevice):
     self.img_file.open()
       
   def flush(self):
-    pass
+    self.img_file.flush()
         
   def close(self):
     self.img_file.close()
@@ -28,3 +28,9 @@ class HDFBlockDevice(BlockDevice):
   
   def write_block(self, blk_num, data):
     return self.img_file.write_blk(blk_num, data)
+
+  def read_blocks(self, blk_num, num):
+    return self.img_file.read_blks(blk_num, num)
+
+  def write_blocks(self, blk_num, data):
+    return self.img_file.write_blks(blk_num, data)
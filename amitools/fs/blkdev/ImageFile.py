@@ -1,13 +1,22 @@
 import os
 import stat
+import mmap
 import amitools.util.BlkDevTools as BlkDevTools
 
 class ImageFile:
-  def __init__(self, file_name, read_only=False, block_bytes=512):
+  """access the blocks of an image file or a raw device.
+
+     If use_mmap is set and the image is a regular file then the file is
+     memory mapped: blocks are read and written directly in the mapping
+     without a seek/read or seek/write syscall pair per block.
+  """
+  def __init__(self, file_name, read_only=False, block_bytes=512, use_mmap=False):
     self.file_name = file_name
     self.read_only = read_only
     self.block_bytes = block_bytes
+    self.use_mmap = use_mmap
     self.fh = None
+    self.mm = None
     self.size = 0
     self.num_blocks = 0
     self.pos = 0
@@ -22,7 +31,8 @@ class ImageFile:
     # is it a block/char device?
     st = os.stat(self.file_name)
     mode = st.st_mode
-    if stat.S_ISBLK(mode) or stat.S_ISCHR(mode):
+    is_dev = stat.S_ISBLK(mode) or stat.S_ISCHR(mode)
+    if is_dev:
       self.size = BlkDevTools.getblkdevsize(self.file_name)
     else:
       # get size and make sure its not empty
@@ -36,11 +46,27 @@ class ImageFile:
     else:
       flags = "r+b"
     self.fh = file(self.file_name, flags)
-  
+    # map regular files
+    if self.use_mmap and not is_dev:
+      self._map()
+
+  def _map(self):
+    if self.read_only:
+      access = mmap.ACCESS_READ
+    else:
+      access = mmap.ACCESS_WRITE
+    try:
+      self.mm = mmap.mmap(self.fh.fileno(), self.num_blocks * self.block_bytes, access=access)
+    except (EnvironmentError, OverflowError):
+      # e.g. no address space left: fall back to file access
+      self.mm = None
+
   def read_blk(self, blk_num):
     if blk_num >= self.num_blocks:
       raise IOError("Invalid image file block num: got %d but max is %d" % (blk_num, self.num_blocks))
     off = blk_num * self.block_bytes
+    if self.mm != None:
+      return self.mm[off:off + self.block_bytes]
     if off != self.pos:
       self.fh.seek(off, os.SEEK_SET)
     num = self.block_bytes
@@ -48,6 +74,20 @@ class ImageFile:
     self.pos = off + num
     return data
     
+  def read_blks(self, blk_num, num):
+    """read num consecutive blocks with a single access"""
+    if blk_num + num > self.num_blocks:
+      raise IOError("Invalid image file block num: got %d but max is %d" % (blk_num + num - 1, self.num_blocks))
+    off = blk_num * self.block_bytes
+    size = num * self.block_bytes
+    if self.mm != None:
+      return self.mm[off:off + size]
+    if off != self.pos:
+      self.fh.seek(off, os.SEEK_SET)
+    data = self.fh.read(size)
+    self.pos = off + size
+    return data
+
   def write_blk(self, blk_num, data):
     if self.read_only:
       raise IOError("Can't write block: image file is read-only")
@@ -56,22 +96,57 @@ class ImageFile:
     if len(data) != self.block_bytes:
       raise IOError("Invalid block size written: got %d but size is %d" % (len(data), self.block_bytes))
     off = blk_num * self.block_bytes
+    if self.mm != None:
+      # mmap.write() takes strings and read-only buffers
+      if isinstance(data, bytearray):
+        data = str(data)
+      self.mm.seek(off)
+      self.mm.write(data)
+      return
     if off != self.pos:
       self.fh.seek(off, os.SEEK_SET)
     self.fh.write(data)
     self.pos = off + len(data)
   
+  def write_blks(self, blk_num, data):
+    """write consecutive blocks with a single access"""
+    if self.read_only:
+      raise IOError("Can't write block: image file is read-only")
+    if len(data) % self.block_bytes != 0:
+      raise IOError("Invalid block size written: got %d but size is %d" % (len(data), self.block_bytes))
+    num = len(data) / self.block_bytes
+    if blk_num + num > self.num_blocks:
+      raise IOError("Invalid image file block num: got %d but max is %d" % (blk_num + num - 1, self.num_blocks))
+    off = blk_num * self.block_bytes
+    if self.mm != None:
+      if isinstance(data, bytearray):
+        data = str(data)
+      self.mm.seek(off)
+      self.mm.write(data)
+      return
+    if off != self.pos:
+      self.fh.seek(off, os.SEEK_SET)
+    self.fh.write(data)
+    self.pos = off + len(data)
+
+  def flush(self):
+    if self.mm != None and not self.read_only:
+      self.mm.flush()
+
   def close(self):
+    if self.mm != None:
+      self.flush()
+      self.mm.close()
+      self.mm = None
     if self.fh != None:
       self.fh.close()
       self.fh = None
-  
+
   def create(self, num_blocks):
     if self.read_only:
       raise IOError("Can't create image file in read only mode")
-    block = '\0' * self.block_bytes
+    # extending the empty file creates a sparse file filled with zeros
     fh = file(self.file_name, "wb")
-    for i in xrange(num_blocks):
-      fh.write(block)
+    fh.truncate(num_blocks * self.block_bytes)
     fh.close()
   
\ No newline at end of file
@@ -46,3 +46,15 @@ class PartBlockDevice(BlockDevice):
     if len(data) != self.block_bytes:
       raise ValueError("Invalid Part block size written: got %d but size is %d" % (len(data), self.block_bytes))
     self.raw_blkdev.write_block(self.blk_off + blk_num, data)
+
+  def read_blocks(self, blk_num, num):
+    if blk_num + num > self.num_blocks:
+      raise ValueError("Invalid Part block num: got %d but max is %d" % (blk_num + num - 1, self.num_blocks))
+    return self.raw_blkdev.read_blocks(self.blk_off + blk_num, num)
+
+  def write_blocks(self, blk_num, data):
+    if len(data) % self.block_bytes != 0:
+      raise ValueError("Invalid Part block size written: got %d but size is %d" % (len(data), self.block_bytes))
+    if blk_num + len(data) / self.block_bytes > self.num_blocks:
+      raise ValueError("Invalid Part block num: got %d but max is %d" % (blk_num + len(data) / self.block_bytes - 1, self.num_blocks))
+    self.raw_blkdev.write_blocks(self.blk_off + blk_num, data)
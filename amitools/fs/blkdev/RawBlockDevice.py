@@ -6,7 +6,7 @@ from ImageFile import ImageFile
 
 class RawBlockDevice(BlockDevice):
   def __init__(self, raw_file, read_only=False, block_bytes=512):
-    self.img_file = ImageFile(raw_file, read_only, block_bytes)
+    self.img_file = ImageFile(raw_file, read_only, block_bytes, use_mmap=True)
 
   def create(self, num_blocks):
     self.img_file.create(num_blocks)
@@ -21,7 +21,7 @@ class RawBlockDevice(BlockDevice):
     self.num_blocks = self.img_file.num_blocks
           
   def flush(self):
-    pass
+    self.img_file.flush()
         
   def close(self):
     self.img_file.close()
@@ -31,3 +31,9 @@ class RawBlockDevice(BlockDevice):
   
   def write_block(self, blk_num, data):
     self.img_file.write_blk(blk_num, data)
+
+  def read_blocks(self, blk_num, num):
+    return self.img_file.read_blks(blk_num, num)
+
+  def write_blocks(self, blk_num, data):
+    self.img_file.write_blks(blk_num, data)
@@ -1,6 +1,7 @@
 import struct
 import ctypes
 from ..TimeStamp import TimeStamp
+import Checksum
 
 class Block:
   # mark end of block list
@@ -102,6 +103,29 @@ class Block:
       num = self.block_longs + num
     return struct.unpack_from(">I",self.data,num*4)[0]
 
+  def _get_long_table(self, num, count):
+    """get a table of longs that grows downwards starting at long num"""
+    if num < 0:
+      num = self.block_longs + num
+    if count == 0:
+      return []
+    start = num - count + 1
+    vals = list(Checksum.get_longs(self.data, count, start*4))
+    vals.reverse()
+    return vals
+
+  def _put_long_table(self, num, vals):
+    """put a table of longs that grows downwards starting at long num"""
+    if num < 0:
+      num = self.block_longs + num
+    count = len(vals)
+    if count == 0:
+      return
+    start = num - count + 1
+    vals = list(vals)
+    vals.reverse()
+    Checksum.get_longs_struct(count).pack_into(self.data, start*4, *vals)
+
   def _put_slong(self, num, val):
     if num < 0:
       num = self.block_longs + num
@@ -141,11 +165,7 @@ class Block:
     self._put_long(self.chk_loc, self.calc_chksum)
   
   def _calc_chksum(self):
-    chksum = 0
-    for i in xrange(self.block_longs):
-      if i != self.chk_loc:
-        chksum += self._get_long(i)
-    return (-chksum) & 0xffffffff
+    return Checksum.calc_chksum(self.data, self.block_longs, self.chk_loc)
   
   def _get_timestamp(self, loc):
     days = self._get_long(loc)
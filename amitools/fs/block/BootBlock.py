@@ -1,5 +1,6 @@
 import os.path
 from Block import Block
+import Checksum
 import amitools.fs.DosType as DosType
 
 class BootBlock(Block):  
@@ -48,16 +49,8 @@ class BootBlock(Block):
   
   def _calc_chksum(self):
     all_blks = [self] + self.extra_blks
-    n = self.blkdev.block_longs
-    chksum = 0
-    for blk in all_blks:
-      for i in xrange(n):
-        if i != 1: # skip chksum
-          chksum += blk._get_long(i)
-          if chksum > 0xffffffff:
-            chksum += 1
-            chksum &= 0xffffffff
-    return (~chksum) & 0xffffffff
+    datas = [blk.data for blk in all_blks]
+    return Checksum.calc_boot_chksum(datas, self.blkdev.block_longs)
   
   def read(self):
     self._read_data()
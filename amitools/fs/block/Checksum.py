@@ -0,0 +1,78 @@
+"""Checksums of AmigaDOS blocks
+
+All longs of a block are unpacked with a single cached struct call and
+summed up with the builtin sum() instead of decoding each long separately.
+"""
+
+import array
+import struct
+import sys
+
+# array type code for signed 32 bit values. signed items are plain ints
+# and sum up much faster than unsigned ones. all sums are taken modulo 2^32
+if array.array('i').itemsize == 4:
+  _long_type = 'i'
+else:
+  _long_type = 'l'
+
+_big_endian = sys.byteorder == 'big'
+
+# num_longs -> struct.Struct
+_structs = {}
+
+def get_longs_struct(num_longs):
+  """return a cached struct decoding num_longs big endian longs"""
+  s = _structs.get(num_longs)
+  if s == None:
+    s = struct.Struct(">%dI" % num_longs)
+    _structs[num_longs] = s
+  return s
+
+def get_longs(data, num_longs, offset=0):
+  return get_longs_struct(num_longs).unpack_from(data, offset)
+
+def calc_chksum(data, num_longs, chk_loc):
+  """standard block checksum: negated sum of all longs but the checksum"""
+  longs = get_longs(data, num_longs)
+  return (longs[chk_loc] - sum(longs)) & 0xffffffff
+
+def calc_boot_chksum(datas, num_longs):
+  """boot block checksum: sum with carry of all longs in all boot blocks
+     skipping the checksum (long #1 in the first block), then inverted
+  """
+  chksum = 0
+  for data in datas:
+    chksum += sum(get_longs(data, num_longs))
+  chksum -= get_longs(datas[0], 2)[1]
+  # add carries back in
+  while chksum > 0xffffffff:
+    chksum = (chksum & 0xffffffff) + (chksum >> 32)
+  return (~chksum) & 0xffffffff
+
+def get_block_longs(data, num_longs):
+  """decode all complete blocks in data to an array of signed longs"""
+  block_bytes = num_longs * 4
+  longs = array.array(_long_type)
+  longs.fromstring(buffer(data, 0, len(data) - len(data) % block_bytes))
+  if not _big_endian:
+    longs.byteswap()
+  return longs
+
+def calc_chksums(data, num_longs, chk_loc):
+  """batch version of calc_chksum() for a buffer holding many blocks.
+     return a list with the checksum of each block
+  """
+  longs = get_block_longs(data, num_longs)
+  result = []
+  for off in xrange(0, len(longs), num_longs):
+    chksum = longs[off + chk_loc] - sum(longs[off:off + num_longs])
+    result.append(chksum & 0xffffffff)
+  return result
+
+def check_chksums(data, num_longs):
+  """return a list of flags telling which blocks in data have a valid checksum"""
+  longs = get_block_longs(data, num_longs)
+  result = []
+  for off in xrange(0, len(longs), num_longs):
+    result.append(sum(longs[off:off + num_longs]) & 0xffffffff == 0)
+  return result
@@ -32,7 +32,8 @@ class DirCacheRecord:
     self.size = d[1]
     self.protect = d[2]
     self.mod_ts = TimeStamp(d[5],d[6],d[7])
-    self.type = ord(data[off + 22])
+    # signed type byte -> sub_type of the header block
+    self.sub_type = struct.unpack_from(">b",data,offset=off + 22)[0] & 0xffffffff
     # name
     name_len = ord(data[off + 23])
     name_off = off + 24
@@ -48,6 +49,7 @@ class DirCacheRecord:
     # header
     ts = self.mod_ts
     struct.pack_into(">IIIHHHHH",data,off,self.entry,self.size,self.protect,0,0,ts.days,ts.mins,ts.ticks)
+    data[off + 22] = chr(self.sub_type & 0xff)
     # name
     name_len = len(self.name)
     data[off + 23] = chr(name_len)
@@ -98,9 +100,14 @@ class DirCacheBlock(Block):
     # get records
     off = 24
     for i in xrange(self.num_records):
+      # record header must fit into block
+      if off + 25 > self.blkdev.block_bytes:
+        self.valid = False
+        return False
       r = DirCacheRecord()
       off = r.get(self.data, off)
-      if off == -1:
+      if off > self.blkdev.block_bytes:
+        self.valid = False
         return False
       self.records.append(r)
     
@@ -30,9 +30,7 @@ class FileHeaderBlock(Block):
     mbc = self.blkdev.block_longs - 56
     if bc > mbc:
       bc = mbc
-    self.data_blocks = []
-    for i in xrange(bc):
-      self.data_blocks.append(self._get_long(-51-i))
+    self.data_blocks = self._get_long_table(-51, bc)
     
     self.protect = self._get_long(-48)
     self.protect_flags = ProtectFlags(self.protect)
@@ -54,8 +52,7 @@ class FileHeaderBlock(Block):
     self._put_long(4, self.first_data)
     
     # data blocks
-    for i in xrange(len(self.data_blocks)):
-      self._put_long(-51-i, self.data_blocks[i])
+    self._put_long_table(-51, self.data_blocks)
     
     self._put_long(-48, self.protect)
     self._put_long(-47, self.byte_size)
@@ -26,9 +26,7 @@ class FileListBlock(Block):
     mbc = self.blkdev.block_longs - 56
     if bc > mbc:
       bc = mbc
-    self.data_blocks = []
-    for i in xrange(bc):
-      self.data_blocks.append(self._get_long(-51-i))
+    self.data_blocks = self._get_long_table(-51, bc)
     
     self.parent = self._get_long(-3)
     self.extension = self._get_long(-2)
@@ -52,8 +50,7 @@ class FileListBlock(Block):
     self._put_long(2, self.block_count)
     
     # data blocks
-    for i in xrange(len(self.data_blocks)):
-      self._put_long(-51-i, self.data_blocks[i])
+    self._put_long_table(-51, self.data_blocks)
     
     self._put_long(-3, self.parent)
     self._put_long(-2, self.extension)
@@ -64,6 +64,7 @@ HUNK_PPC_CODE
 ]
 loadseg_valid_extra_hunks = [
 HUNK_ABSRELOC32,
+HUNK_RELOC32SHORT,
 HUNK_DREL32,
 HUNK_DEBUG,
 HUNK_SYMBOL,
@@ -1,15 +1,75 @@
 """A class for reading Amiga executables and object files in Hunk format"""
 
 import os
+import mmap
 import struct
 import StringIO
 from types import *
 from Hunk import *
 
+class HunkLazyError(Exception):
+  """a lazily parsed hunk body turned out to be invalid"""
+  pass
+
+class LazyHunk(dict):
+  """a hunk dict whose body is decoded when a missing key is accessed"""
+
+  def __init__(self, *args):
+    dict.__init__(self, *args)
+    self.loader = None
+
+  def load(self):
+    loader = self.loader
+    if loader != None:
+      self.loader = None
+      loader(self)
+
+  def __missing__(self, key):
+    self.load()
+    if dict.has_key(self, key):
+      return dict.__getitem__(self, key)
+    raise KeyError(key)
+
+  def has_key(self, key):
+    if not dict.has_key(self, key):
+      self.load()
+    return dict.has_key(self, key)
+
+  __contains__ = has_key
+
+  def get(self, key, default=None):
+    if not dict.has_key(self, key):
+      self.load()
+    return dict.get(self, key, default)
+
+  def keys(self):
+    self.load()
+    return dict.keys(self)
+
+  def items(self):
+    self.load()
+    return dict.items(self)
+
+  def values(self):
+    self.load()
+    return dict.values(self)
+
+  def __iter__(self):
+    self.load()
+    return dict.__iter__(self)
+
 class HunkReader:
-  """Load Amiga executable Hunk structures"""
+  """Load Amiga executable Hunk structures
+
+     In lazy mode the file is mapped into memory and the bodies of code,
+     data, relocation, symbol and debug hunks are only skipped while
+     reading. Their offset and size is recorded and they are decoded when
+     a key of the hunk is accessed for the first time.
+  """
   
-  def __init__(self):
+  def __init__(self, lazy=False):
+    self.lazy = lazy
+    self.file_size = 0
     self.hunks = []
     self.error_string = None
     self.type = None
@@ -29,7 +89,7 @@ class HunkReader:
         if v != None:
           result.append(v)
       return "[" + ",".join(result) + "]"
-    elif type(obj) == DictType:
+    elif isinstance(obj, DictType):
       if obj.has_key('type_name'):
         type_name = obj['type_name']
         return type_name.replace('HUNK_','')
@@ -292,6 +352,118 @@ class HunkReader:
       hunk['data'] = f.read(size)
     return RESULT_OK
   
+  # ----- lazy mode: skip hunk bodies -----
+
+  def skip_bytes(self, f, hunk, num_bytes):
+    pos = f.tell() + num_bytes
+    if pos > self.file_size:
+      self.error_string = "%s is truncated" % (hunk['type_name'])
+      return RESULT_INVALID_HUNK_FILE
+    f.seek(pos)
+    return RESULT_OK
+
+  def skip_to(self, f, num_bytes):
+    # like a short read: do not seek beyond the end of file
+    f.seek(min(f.tell() + num_bytes, self.file_size))
+
+  def skip_code_or_data(self, f, hunk):
+    num_longs = self.read_long(f)
+    if num_longs < 0:
+      self.error_string = "%s has invalid size" % (hunk['type_name'])
+      return RESULT_INVALID_HUNK_FILE
+    size = num_longs * 4
+    hunk['size'] = size & ~HUNKF_ALL
+    flags = size & HUNKF_ALL
+    self.set_mem_flags(hunk, flags, 30)
+    hunk['data_file_offset'] = f.tell()
+    # a short read of the data is tolerated as in parse_code_or_data()
+    self.skip_to(f, hunk['size'])
+    return RESULT_OK
+
+  def skip_reloc(self, f, hunk):
+    while True:
+      num_relocs = self.read_long(f)
+      if num_relocs < 0:
+        self.error_string = "%s has invalid number of relocations" % (hunk['type_name'])
+        return RESULT_INVALID_HUNK_FILE
+      elif num_relocs == 0:
+        return RESULT_OK
+      hunk_num = self.read_long(f)
+      if hunk_num < 0:
+        self.error_string = "%s has invalid hunk num" % (hunk['type_name'])
+        return RESULT_INVALID_HUNK_FILE
+      result = self.skip_bytes(f, hunk, (num_relocs & 0xffff) * 4)
+      if result != RESULT_OK:
+        return result
+
+  def skip_reloc_short(self, f, hunk):
+    total_words = 0
+    while True:
+      num_relocs = self.read_word(f)
+      if num_relocs < 0:
+        self.error_string = "%s has invalid number of relocations" % (hunk['type_name'])
+        return RESULT_INVALID_HUNK_FILE
+      elif num_relocs == 0:
+        total_words += 1
+        break
+      hunk_num = self.read_word(f)
+      if hunk_num < 0:
+        self.error_string = "%s has invalid hunk num" % (hunk['type_name'])
+        return RESULT_INVALID_HUNK_FILE
+      count = num_relocs & 0xffff
+      total_words += count + 2
+      result = self.skip_bytes(f, hunk, count * 2)
+      if result != RESULT_OK:
+        return result
+    # padding
+    if total_words & 1 == 1:
+      self.read_word(f)
+    return RESULT_OK
+
+  def skip_symbol(self, f, hunk):
+    while True:
+      num_longs = self.read_long(f)
+      if num_longs < 0:
+        self.error_string = "%s has invalid symbol name" % (hunk['type_name'])
+        return RESULT_INVALID_HUNK_FILE
+      elif num_longs == 0:
+        return RESULT_OK
+      # name and value
+      result = self.skip_bytes(f, hunk, (num_longs & 0xffffff) * 4 + 4)
+      if result != RESULT_OK:
+        return result
+
+  def skip_debug(self, f, hunk):
+    num_longs = self.read_long(f)
+    if num_longs < 0:
+      self.error_string = "%s has invalid size" % (hunk['type_name'])
+      return RESULT_INVALID_HUNK_FILE
+    self.skip_to(f, num_longs * 4)
+    return RESULT_OK
+
+  def skip_lazy(self, f, hunk, skip_func, parse_func):
+    """skip the body of a hunk and setup the hunk to parse it on access"""
+    body_offset = f.tell()
+    result = skip_func(f, hunk)
+    hunk['body_offset'] = body_offset
+    hunk['body_size'] = f.tell() - body_offset
+    hunk.loader = lambda h: self.load_lazy(f, h, parse_func, body_offset)
+    return result
+
+  def load_lazy(self, f, hunk, parse_func, body_offset):
+    pos = f.tell()
+    f.seek(body_offset)
+    result = parse_func(f, hunk)
+    f.seek(pos)
+    if result != RESULT_OK:
+      raise HunkLazyError(self.error_string)
+
+  def load_all(self):
+    """decode all lazily skipped hunk bodies"""
+    for hunk in self.hunks:
+      if isinstance(hunk, LazyHunk):
+        hunk.load()
+
   def find_first_code_hunk(self):
     for hunk in self.hunks:
       if hunk['type'] == HUNK_CODE:
@@ -523,7 +695,7 @@ class HunkReader:
      Return status and set self.error_string on failure
   """
   def read_file(self, hfile, v37_compat=None):
-    with open(hfile) as f:
+    with open(hfile, "rb") as f:
       return self.read_file_obj(hfile, f, v37_compat)
 
   """Read a hunk from memory"""
@@ -532,6 +704,17 @@ class HunkReader:
     return self.read_file_obj(name, fobj, v37_compat)
 
   def read_file_obj(self, hfile, f, v37_compat):
+    # in lazy mode map real files into memory
+    if self.lazy:
+      if isinstance(f, file):
+        try:
+          f = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        except (ValueError, mmap.error):
+          # empty files can't be mapped
+          pass
+      f.seek(0, os.SEEK_END)
+      self.file_size = f.tell()
+      f.seek(0)
     self.hunks = []
     is_first_hunk = True
     was_end = False
@@ -596,7 +779,10 @@ class HunkReader:
         was_potentail_v37_hunk = False
         was_overlay = False
         
-        hunk = { 'type' : hunk_type, 'hunk_file_offset' : hunk_file_offset }
+        if self.lazy:
+          hunk = LazyHunk({ 'type' : hunk_type, 'hunk_file_offset' : hunk_file_offset })
+        else:
+          hunk = { 'type' : hunk_type, 'hunk_file_offset' : hunk_file_offset }
         self.hunks.append(hunk)
         hunk['type_name'] = hunk_names[hunk_type]
         self.set_mem_flags(hunk, hunk_flags, 30)
@@ -623,7 +809,10 @@ class HunkReader:
           result = self.parse_header(f,hunk)
         # ----- HUNK_CODE/HUNK_DATA ------
         elif hunk_type == HUNK_CODE or hunk_type == HUNK_DATA or hunk_type == HUNK_PPC_CODE:
-          result = self.parse_code_or_data(f,hunk)
+          if self.lazy:
+            result = self.skip_lazy(f,hunk,self.skip_code_or_data,self.parse_code_or_data)
+          else:
+            result = self.parse_code_or_data(f,hunk)
         # ---- HUNK_BSS ----
         elif hunk_type == HUNK_BSS:
           result = self.parse_bss(f,hunk)
@@ -632,20 +821,32 @@ class HunkReader:
           or hunk_type == HUNK_RELRELOC8 or hunk_type == HUNK_RELRELOC16 or hunk_type == HUNK_ABSRELOC32 \
           or hunk_type == HUNK_DREL32 or hunk_type == HUNK_DREL16 or hunk_type == HUNK_DREL8 \
           or hunk_type == HUNK_RELRELOC26:
-          result = self.parse_reloc(f,hunk)
+          if self.lazy:
+            result = self.skip_lazy(f,hunk,self.skip_reloc,self.parse_reloc)
+          else:
+            result = self.parse_reloc(f,hunk)
           # auto fix v37 bug?
           if hunk_type == HUNK_DREL32 and result != RESULT_OK and v37_compat == None:
             f.seek(0)
             return self.read_file_obj(hfile, f, True)
         # ---- HUNK_<reloc short> -----
         elif hunk_type == HUNK_RELOC32SHORT:
-          result = self.parse_reloc_short(f,hunk)
+          if self.lazy:
+            result = self.skip_lazy(f,hunk,self.skip_reloc_short,self.parse_reloc_short)
+          else:
+            result = self.parse_reloc_short(f,hunk)
         # ----- HUNK_SYMBOL -----
         elif hunk_type == HUNK_SYMBOL:
-          result = self.parse_symbol(f,hunk)
+          if self.lazy:
+            result = self.skip_lazy(f,hunk,self.skip_symbol,self.parse_symbol)
+          else:
+            result = self.parse_symbol(f,hunk)
         # ----- HUNK_DEBUG -----
         elif hunk_type == HUNK_DEBUG:
-          result = self.parse_debug(f,hunk)
+          if self.lazy:
+            result = self.skip_lazy(f,hunk,self.skip_debug,self.parse_debug)
+          else:
+            result = self.parse_debug(f,hunk)
         # ----- HUNK_END -----
         elif hunk_type == HUNK_END:
           was_end = True
@@ -1,13 +1,33 @@
-import ctypes
+import array
 import struct
+import sys
 import Hunk
 
+# numpy is optional: if available it is used to relocate in bulk
+try:
+  import numpy
+except ImportError:
+  numpy = None
+
+# hunks with 32 bit relocations applied by loadseg()
+# HUNK_DREL32 is a buggy V37 HUNK_RELOC32SHORT...
+reloc32_hunks = (Hunk.HUNK_ABSRELOC32, Hunk.HUNK_RELOC32SHORT, Hunk.HUNK_DREL32)
+
+# array type code for unsigned 32 bit values
+if array.array('I').itemsize == 4:
+  _long_type = 'I'
+else:
+  _long_type = 'L'
+
+_big_endian = sys.byteorder == 'big'
+
 class HunkRelocate:
-  
-  def __init__(self, hunk_file, verbose=False):
+
+  def __init__(self, hunk_file, verbose=False, use_numpy=True):
     self.hunk_file = hunk_file
     self.verbose = verbose
-    
+    self.use_numpy = use_numpy and numpy != None
+
   def get_sizes(self):
     sizes = []
     for segment in self.hunk_file.segments:
@@ -41,50 +61,126 @@ class HunkRelocate:
       addrs.append(addr)
       addr += s + padding
     return addrs
-  
+
+  def get_relocs(self, segment):
+    """merge the 32 bit relocations of all reloc hunks in a segment.
+       return: map of hunk_num -> array of offsets
+    """
+    relocs = {}
+    for hunk in segment[1:]:
+      if hunk['type'] in reloc32_hunks:
+        reloc = hunk['reloc']
+        for hunk_num in reloc:
+          if relocs.has_key(hunk_num):
+            relocs[hunk_num].extend(reloc[hunk_num])
+          else:
+            relocs[hunk_num] = array.array(_long_type, reloc[hunk_num])
+    return relocs
+
   def relocate(self, addr):
     datas = []
     for segment in self.hunk_file.segments:
       main_hunk = segment[0]
       hunk_no = main_hunk['hunk_no']
       alloc_size = main_hunk['alloc_size']
-      size = main_hunk['size']
-      data = ctypes.create_string_buffer(alloc_size)      
-      
+      data = bytearray(alloc_size)
+
       # fill in segment data
       if main_hunk.has_key('data'):
-        data.value = main_hunk['data']
-        
+        hunk_data = main_hunk['data'][:alloc_size]
+        data[0:len(hunk_data)] = hunk_data
+
       if self.verbose:
         print "#%02d @ %06x" % (hunk_no, addr[hunk_no])
-      
-      # find relocation hunks
-      for hunk in segment[1:]:
-        # abs reloc 32 or
-        # HUNK_DREL32 is a buggy V37 HUNK_RELOC32SHORT...
-        if hunk['type'] == Hunk.HUNK_ABSRELOC32 or hunk['type'] == Hunk.HUNK_DREL32:
-          reloc = hunk['reloc']
-          for hunk_num in reloc:
-            # get address of other hunk
-            hunk_addr = addr[hunk_num]
-            offsets = reloc[hunk_num]
-            for offset in offsets:
-              self.relocate32(hunk_no,data,offset,hunk_addr)
-        
-      datas.append(data.raw)
+
+      # apply relocations grouped by target hunk
+      relocs = self.get_relocs(segment)
+      if len(relocs) > 0:
+        if self.verbose:
+          for hunk_num in sorted(relocs):
+            for offset in relocs[hunk_num]:
+              self.relocate32(hunk_no,data,offset,addr[hunk_num])
+        elif self.use_numpy:
+          self.relocate32_numpy(data, relocs, addr)
+        else:
+          self.relocate32_array(data, relocs, addr)
+
+      datas.append(str(data))
     return datas
 
+  def _get_longs(self, data):
+    end = len(data) & ~3
+    longs = array.array(_long_type)
+    longs.fromstring(str(data[0:end]))
+    if not _big_endian:
+      longs.byteswap()
+    return longs
+
+  def _put_longs(self, data, longs):
+    if not _big_endian:
+      longs.byteswap()
+    data[0:len(longs) * 4] = longs.tostring()
+
+  def relocate32_array(self, data, relocs, addr):
+    """apply relocations on a long word array of the segment data.
+       long aligned relocations never overlap. if an offset is not long
+       aligned then relocations may overlap and the result depends on
+       their order: relocate32_seq() applies them one after another.
+    """
+    for hunk_num in relocs:
+      for o in relocs[hunk_num]:
+        if o & 3:
+          self.relocate32_seq(data, relocs, addr)
+          return
+    longs = self._get_longs(data)
+    for hunk_num in relocs:
+      hunk_addr = addr[hunk_num]
+      for o in relocs[hunk_num]:
+        i = o >> 2
+        longs[i] = (longs[i] + hunk_addr) & 0xffffffff
+    self._put_longs(data, longs)
+
+  def relocate32_seq(self, data, relocs, addr):
+    """apply relocations one after another in the order of the verbose
+       relocate32() loop"""
+    for hunk_num in sorted(relocs):
+      hunk_addr = addr[hunk_num]
+      for o in relocs[hunk_num]:
+        delta = struct.unpack_from(">I", data, o)[0]
+        struct.pack_into(">I", data, o, (delta + hunk_addr) & 0xffffffff)
+
+  def relocate32_numpy(self, data, relocs, addr):
+    """apply relocations with numpy on a big endian long word view.
+       numpy.add.at() adds repeatedly given offsets as often as they
+       appear like loadseg() does. if an offset is not long aligned then
+       relocations may overlap and relocate32_seq() applies them in order.
+    """
+    offsets = []
+    addrs = []
+    for hunk_num in relocs:
+      num = len(relocs[hunk_num])
+      offsets.append(numpy.array(relocs[hunk_num], dtype=numpy.intp))
+      addrs.append(numpy.empty(num, dtype=numpy.uint32))
+      addrs[-1].fill(addr[hunk_num] & 0xffffffff)
+    offsets = numpy.concatenate(offsets)
+    if numpy.any(offsets & 3):
+      self.relocate32_seq(data, relocs, addr)
+      return
+    num_longs = len(data) / 4
+    longs = numpy.frombuffer(buffer(data), dtype='>u4', count=num_longs).copy()
+    # uint32 additions wrap around modulo 2^32
+    numpy.add.at(longs, offsets >> 2, numpy.concatenate(addrs))
+    data[0:num_longs * 4] = longs.tostring()
+
   def relocate32(self, hunk_no, data, offset, hunk_addr):
     delta = self.read_long(data, offset)
-    addr = hunk_addr + delta
+    addr = (hunk_addr + delta) & 0xffffffff
     self.write_long(data, offset, addr)
     if self.verbose:
       print "#%02d + %06x: %06x (delta) + %06x (hunk_addr) -> %06x" % (hunk_no, offset, delta, hunk_addr, addr)
-    
+
   def read_long(self, data, offset):
-    bytes = data[offset:offset+4]
-    return struct.unpack(">i",bytes)[0]
-  
+    return struct.unpack_from(">I",data,offset)[0]
+
   def write_long(self, data, offset, value):
-    bytes = struct.pack(">i",value)
-    data[offset:offset+4] = bytes
+    struct.pack_into(">I",data,offset,value)
@@ -0,0 +1,345 @@
+"""Read LHA/LZH archives and decompress their entries in-process
+
+Supports header levels 0, 1 and 2 and the methods -lh0- (stored),
+-lhd- (directory) and the static Huffman methods -lh4- to -lh7-.
+"""
+
+import struct
+
+class LHAError(Exception):
+  pass
+
+# method -> dictionary bits
+lhx_dicbits = {
+  '-lh4-' : 12,
+  '-lh5-' : 13,
+  '-lh6-' : 15,
+  '-lh7-' : 16
+}
+
+# ----- CRC-16 (poly 0xa001) -----
+
+def _make_crc_table():
+  table = []
+  for i in xrange(256):
+    r = i
+    for j in xrange(8):
+      if r & 1:
+        r = (r >> 1) ^ 0xa001
+      else:
+        r >>= 1
+    table.append(r)
+  return table
+
+_crc_table = _make_crc_table()
+
+def calc_crc16(data, crc=0):
+  table = _crc_table
+  for b in bytearray(data):
+    crc = table[(crc ^ b) & 0xff] ^ (crc >> 8)
+  return crc
+
+# ----- static Huffman decoder (-lh4- ... -lh7-) -----
+
+# number of literal/length codes: 256 literals + 254 lengths
+NC = 510
+# number of code length codes
+NT = 19
+TBIT = 5
+CBIT = 9
+
+class _BitReader:
+  """read bits MSB first from a string. reads beyond the end return zeros"""
+  def __init__(self, data):
+    self.data = bytearray(data)
+    self.pos = 0
+    self.buf = 0
+    self.cnt = 0
+
+  def fill(self, n):
+    data = self.data
+    while self.cnt < n:
+      if self.pos < len(data):
+        b = data[self.pos]
+        self.pos += 1
+      else:
+        b = 0
+      self.buf = ((self.buf << 8) | b) & 0xffffffff
+      self.cnt += 8
+
+  def peek(self, n):
+    if self.cnt < n:
+      self.fill(n)
+    return (self.buf >> (self.cnt - n)) & ((1 << n) - 1)
+
+  def skip(self, n):
+    if self.cnt < n:
+      self.fill(n)
+    self.cnt -= n
+
+  def get(self, n):
+    if n == 0:
+      return 0
+    v = self.peek(n)
+    self.cnt -= n
+    return v
+
+def _make_table(lens):
+  """build a canonical Huffman lookup table from the code lengths.
+     return (max_len, table) where table is indexed with max_len bits
+     and holds (symbol << 5) | length
+  """
+  max_len = max(lens)
+  if max_len == 0:
+    raise LHAError("empty Huffman table")
+  if max_len > 16:
+    raise LHAError("invalid Huffman code length: %d" % max_len)
+  size = 1 << max_len
+  table = [0] * size
+  code = 0
+  for l in xrange(1, max_len + 1):
+    for sym in xrange(len(lens)):
+      if lens[sym] == l:
+        span = 1 << (max_len - l)
+        start = code << (max_len - l)
+        if start + span > size:
+          raise LHAError("invalid Huffman table")
+        entry = (sym << 5) | l
+        table[start:start+span] = [entry] * span
+        code += 1
+    code <<= 1
+  return (max_len, table)
+
+class _HuffTable:
+  def __init__(self, lens=None, const=None):
+    if lens != None:
+      self.bits, self.table = _make_table(lens)
+      self.const = None
+    else:
+      self.const = const
+
+  def decode(self, br):
+    if self.const != None:
+      return self.const
+    e = self.table[br.peek(self.bits)]
+    if e == 0:
+      raise LHAError("invalid Huffman code")
+    br.skip(e & 31)
+    return e >> 5
+
+def _read_pt_len(br, nn, nbit, i_special):
+  n = br.get(nbit)
+  if n == 0:
+    return _HuffTable(const=br.get(nbit))
+  if n > nn:
+    raise LHAError("invalid code length count")
+  lens = [0] * nn
+  i = 0
+  while i < n:
+    c = br.peek(3)
+    if c == 7:
+      # unary extension: count the one bits after the first three
+      br.skip(3)
+      while br.get(1) == 1:
+        c += 1
+        if c > 16:
+          raise LHAError("invalid code length")
+    else:
+      br.skip(3)
+    lens[i] = c
+    i += 1
+    if i == i_special:
+      c = br.get(2)
+      i += c
+  return _HuffTable(lens)
+
+def _read_c_len(br, pt):
+  n = br.get(CBIT)
+  if n == 0:
+    return _HuffTable(const=br.get(CBIT))
+  if n > NC:
+    raise LHAError("invalid literal count")
+  lens = [0] * NC
+  i = 0
+  while i < n:
+    c = pt.decode(br)
+    if c <= 2:
+      if c == 0:
+        c = 1
+      elif c == 1:
+        c = br.get(4) + 3
+      else:
+        c = br.get(CBIT) + 20
+      i += c
+    else:
+      lens[i] = c - 2
+      i += 1
+  if i > NC:
+    raise LHAError("invalid literal lengths")
+  return _HuffTable(lens)
+
+def decode_lhx(data, orig_size, dicbit):
+  """decompress -lh4- ... -lh7- data"""
+  if dicbit <= 13:
+    np, pbit = 14, 4
+  else:
+    np, pbit = dicbit + 1, 5
+  br = _BitReader(data)
+  out = bytearray()
+  left = 0
+  while len(out) < orig_size:
+    # start a new block
+    if left == 0:
+      left = br.get(16)
+      pt = _read_pt_len(br, NT, TBIT, 3)
+      ct = _read_c_len(br, pt)
+      pt = _read_pt_len(br, np, pbit, -1)
+      if left == 0:
+        raise LHAError("empty block")
+    left -= 1
+    c = ct.decode(br)
+    if c < 256:
+      out.append(c)
+    else:
+      length = c - 253
+      dist = pt.decode(br)
+      if dist != 0:
+        dist = (1 << (dist - 1)) + br.get(dist - 1)
+      start = len(out) - dist - 1
+      if start < 0:
+        # before the begin the dictionary is filled with spaces
+        pad = min(-start, length)
+        out += ' ' * pad
+        length -= pad
+        start = 0
+      while length > 0:
+        chunk = out[start:start+length]
+        out += chunk
+        length -= len(chunk)
+        start += len(chunk)
+  return str(out[:orig_size])
+
+# ----- archive -----
+
+class LHAEntry:
+  def __init__(self, name, method, packed_size, orig_size, crc, data_offset, level, comment=None):
+    self.name = name
+    self.method = method
+    self.packed_size = packed_size
+    self.orig_size = orig_size
+    self.crc = crc
+    self.data_offset = data_offset
+    self.level = level
+    self.comment = comment
+
+  def __str__(self):
+    return "[%s:%s:packed=%d,orig=%d]" % (self.name, self.method, self.packed_size, self.orig_size)
+
+  def is_dir(self):
+    return self.method == '-lhd-'
+
+  def is_supported(self):
+    return self.method in ('-lh0-', '-lhd-') or lhx_dicbits.has_key(self.method)
+
+class LHAFile:
+  """an LHA archive held in memory"""
+
+  def __init__(self, data):
+    self.data = data
+    self.entries = []
+
+  def read(self):
+    """parse all headers of the archive"""
+    pos = 0
+    data = self.data
+    while pos < len(data):
+      # end of archive
+      if data[pos] == '\0':
+        break
+      entry, pos = self._read_header(pos)
+      self.entries.append(entry)
+    return self.entries
+
+  def _read_ext_headers(self, pos, size, name, dir_name):
+    """parse level 1/2 extended headers. return (name, dir_name, total size)"""
+    data = self.data
+    total = 0
+    while size > 0:
+      if pos + size > len(data):
+        raise LHAError("truncated extended header")
+      ext_type = ord(data[pos])
+      ext_data = data[pos+1:pos+size-2]
+      if ext_type == 1:
+        name = ext_data
+      elif ext_type == 2:
+        dir_name = ext_data.replace('\xff', '/')
+      total += size
+      pos += size
+      size = struct.unpack_from("<H", data, pos - 2)[0]
+    return (name, dir_name, total)
+
+  def _read_header(self, pos):
+    data = self.data
+    if pos + 22 > len(data):
+      raise LHAError("truncated header at %d" % pos)
+    level = ord(data[pos+20])
+    method = data[pos+2:pos+7]
+    packed_size, orig_size = struct.unpack_from("<II", data, pos+7)
+    dir_name = ""
+    comment = None
+    if level == 0 or level == 1:
+      hdr_size = ord(data[pos]) + 2
+      chksum = ord(data[pos+1])
+      if pos + hdr_size > len(data):
+        raise LHAError("truncated header at %d" % pos)
+      if sum(bytearray(data[pos+2:pos+hdr_size])) & 0xff != chksum:
+        raise LHAError("header checksum error at %d" % pos)
+      name_len = ord(data[pos+21])
+      name = data[pos+22:pos+22+name_len]
+      crc = struct.unpack_from("<H", data, pos+22+name_len)[0]
+      data_pos = pos + hdr_size
+      if level == 1:
+        ext_size = struct.unpack_from("<H", data, data_pos - 2)[0]
+        name, dir_name, total = self._read_ext_headers(data_pos, ext_size, name, dir_name)
+        data_pos += total
+        packed_size -= total
+    elif level == 2:
+      hdr_size = struct.unpack_from("<H", data, pos)[0]
+      crc = struct.unpack_from("<H", data, pos+21)[0]
+      ext_size = struct.unpack_from("<H", data, pos+24)[0]
+      name, dir_name, total = self._read_ext_headers(pos+26, ext_size, "", dir_name)
+      data_pos = pos + hdr_size
+    else:
+      raise LHAError("unsupported header level %d at %d" % (level, pos))
+    # Amiga LhA stores the file comment after the name
+    p = name.find('\0')
+    if p != -1:
+      comment = name[p+1:]
+      name = name[:p]
+    name = name.replace('\\', '/')
+    if dir_name != "":
+      if not dir_name.endswith('/'):
+        dir_name += '/'
+      name = dir_name + name
+    if data_pos + packed_size > len(data):
+      raise LHAError("truncated data of '%s'" % name)
+    entry = LHAEntry(name, method, packed_size, orig_size, crc, data_pos, level, comment)
+    return (entry, data_pos + packed_size)
+
+  def extract(self, entry, check_crc=True):
+    """return the decompressed data of an entry"""
+    packed = self.data[entry.data_offset:entry.data_offset + entry.packed_size]
+    method = entry.method
+    if method == '-lh0-':
+      data = packed
+    elif method == '-lhd-':
+      return ""
+    elif lhx_dicbits.has_key(method):
+      data = decode_lhx(packed, entry.orig_size, lhx_dicbits[method])
+    else:
+      raise LHAError("unsupported method '%s' of '%s'" % (method, entry.name))
+    if len(data) != entry.orig_size:
+      raise LHAError("size mismatch of '%s'" % entry.name)
+    if check_crc and calc_crc16(data) != entry.crc:
+      raise LHAError("CRC error in '%s'" % entry.name)
+    return data
@@ -1,5 +1,4 @@
 import logging
-import ctypes
 
 class AccessMemory:
   # set this label manager to enable memory tracing!
@@ -39,65 +38,36 @@ class AccessMemory:
 
   def w_data(self, addr, data):
     size = len(data)
-    buf = ctypes.create_string_buffer(data)
-    self.mem.write_block(addr,size,buf)
+    self.mem.write_data(addr, data)
     if self.label_mgr != None:
       self.label_mgr.trace_int_block( 'W', addr, size )
 
   def r_data(self, addr, size):
-    buf = ctypes.create_string_buffer(size)
-    self.mem.read_block(addr,size,buf)
+    data = self.mem.read_data(addr, size)
     if self.label_mgr != None:
       self.label_mgr.trace_int_block( 'R', addr, size )
-    return buf.raw
+    return data
 
   def r_cstr(self, addr):
-    off = addr
-    res = ""
-    l = 0
-    v = None
-    while True:
-      v = chr(self.mem.read_mem(0, off))
-      if v == '\0':
-        break
-      res += v
-      off += 1
-      l += 1
+    res = self.mem.read_cstr(addr)
     if self.label_mgr != None:
-      self.label_mgr.trace_int_block( 'R', addr, l, text="CSTR", addon="'%s'"%res, level=logging.INFO )
+      self.label_mgr.trace_int_block( 'R', addr, len(res), text="CSTR", addon="'%s'"%res, level=logging.INFO )
     return res
 
   def w_cstr(self, addr, cstr):
-    off = addr
-    for c in cstr:
-      self.mem.write_mem(0, off, ord(c))
-      off += 1
-    self.mem.write_mem(0, off, 0)
+    self.mem.write_data(addr, cstr + '\0')
     if self.label_mgr != None:
       self.label_mgr.trace_int_block( 'W', addr, len(cstr), text="CSTR", addon="'%s'"%cstr, level=logging.INFO )
 
   def r_bstr(self, addr):
-    off = addr
-    res = ""
-    size = self.mem.read_mem(0, off)
-    off += 1
-    for i in xrange(size):
-      res += chr(self.mem.read_mem(0, off))
-      off += 1
+    size = self.mem.read_mem(0, addr)
+    res = self.mem.read_data(addr + 1, size)
     if self.label_mgr != None:
       self.label_mgr.trace_int_block( 'R', addr, size, text='BSTR', addon="'%s'"%res, level=logging.INFO )
     return res
 
   def w_bstr(self, addr, bstr):
-    off = addr
     size = len(bstr)
-    self.mem.write_mem(0, off, size)
-    off += 1
-    for c in bstr:
-      self.mem.write_mem(0, off, ord(c))
-      off += 1
+    self.mem.write_data(addr, chr(size & 0xff) + bstr)
     if self.label_mgr != None:
       self.label_mgr.trace_int_block( 'W', addr, size, text='BSTR', addon="'%s'"%bstr, level=logging.INFO )
-
-
-  
\ No newline at end of file
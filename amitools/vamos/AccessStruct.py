@@ -32,3 +32,18 @@ class AccessStruct(AccessMemory):
   def s_get_addr(self, name):
     off,width,conv = self.struct_def.get_offset_for_name(name)
     return self.struct_addr + off
+
+  def read_all(self):
+    """read the whole struct in one block and return a dict of all fields"""
+    size = self.struct_def.get_size()
+    data = self.mem.read_data(self.struct_addr, size)
+    if self.label_mgr != None:
+      self.label_mgr.trace_int_block('R', self.struct_addr, size, text="Struct", addon=self.struct_type_name, level=logging.INFO)
+    return self.struct_def.unpack_all(data)
+
+  def write_all(self, values):
+    """write the whole struct in one block. missing fields are cleared"""
+    data = self.struct_def.pack_all(values)
+    self.mem.write_data(self.struct_addr, data)
+    if self.label_mgr != None:
+      self.label_mgr.trace_int_block('W', self.struct_addr, len(data), text="Struct", addon=self.struct_type_name, level=logging.INFO)
@@ -119,6 +119,14 @@ class AmigaLibrary:
 
   def _generate_fast_call_stub(self, ctx, method):
     """generate a fast call stub without any processing"""
+    # with a register snapshot D0 is directly written to the snapshot array
+    regs = ctx.cpu.get_trap_regs()
+    if regs != None:
+      def call_stub(op, pc):
+        d0 = method(ctx)
+        if d0 != None:
+          regs[REG_D0] = d0
+      return call_stub
     def call_stub(op, pc):
       """the generic call stub: call python bound method and 
          if return value exists then set it in CPU's D0 register"""
@@ -155,6 +163,9 @@ class AmigaLibrary:
     # timing code
     if need_timing:
       code.append('  start = time.clock()')
+    if self.profile:
+      code.append('  prof_pc = self.get_callee_pc(ctx)')
+      code.append('  prof_cycles = ctx.run.get_total_cycles()')
       
     # main call: call method and evaluate result
     code.append('  d0 = method(ctx)')
@@ -166,7 +177,7 @@ class AmigaLibrary:
       code.append('  end = time.clock()')
       code.append('  delta = end - start')
     if self.profile:
-      code.append('  self._account_profile_data(name, delta)')
+      code.append('  self._account_profile_data(ctx, name, delta, prof_pc, prof_cycles)')
     if self.benchmark:
       code.append('  self._account_benchmark_data(delta)')
 
@@ -197,8 +208,8 @@ class AmigaLibrary:
     """
     # get call stub
     call_stub = self._generate_call_stub(ctx, bias, name, method, args)
-    # allocate a trap
-    tid = ctx.cpu.trap_setup(call_stub, auto_rts=True)
+    # allocate a trap - the CPU provides a register snapshot while in the call
+    tid = ctx.cpu.trap_setup(call_stub, auto_rts=True, snap_regs=True)
     if tid < 0:
       self.log("patch $%04x: '%s' -> NO TRAP AVAILABLE" % (bias, name), level=logging.ERROR)
       return False
@@ -379,8 +390,9 @@ class AmigaLibrary:
       sum_total += total
     log_prof.info("sum total=%.4f",sum_total)
 
-  def _account_profile_data(self, func, delta):
+  def _account_profile_data(self, ctx, func, delta, caller_pc, cycles):
     """account profiling data for the current function"""
+    ctx.profiler.account_call(self.name, func, caller_pc, delta, cycles)
     if self.profile_map.has_key(func):
       entry = self.profile_map[func]
       entry[0] += delta
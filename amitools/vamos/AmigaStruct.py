@@ -1,3 +1,5 @@
+import struct
+
 struct_pool = {}
 
 class InvalidAmigaTypeException(Exception):
@@ -75,6 +77,10 @@ class AmigaStruct:
     self._lookup = lookup
     self._sub_types = sub_types
     self._pointers = pointers
+
+    # precompile name lookup and whole struct access
+    self._name_map = self._gen_name_map()
+    self._gen_pack_funcs()
   
   def __str__(self):
     return "[Struct: %s size=%d]" % (self._name,self._total_size)
@@ -129,8 +135,114 @@ class AmigaStruct:
   
   # return (off, width, convert_func_pair)
   def get_offset_for_name(self, name):
+    if self._name_map.has_key(name):
+      return self._name_map[name]
     parts = name.split('.')
     return self._get_offset_loop(parts)
+
+  def _gen_names(self, prefix=""):
+    """return all (dotted) names that can be looked up in this struct"""
+    names = []
+    num = 0
+    for f in self._format:
+      name = prefix + f[1]
+      names.append(name)
+      sub_type = self._sub_types[num]
+      if sub_type != None:
+        names += sub_type._gen_names(name + ".")
+      num += 1
+    return names
+
+  def _gen_name_map(self):
+    """map all names to their (off, width, convert_func_pair) tuple"""
+    name_map = {}
+    for name in self._gen_names():
+      name_map[name] = self._get_offset_loop(name.split('.'))
+    return name_map
+
+  def _gen_fields(self, prefix=""):
+    """flatten the struct into a list of all base fields.
+       each field is (name, struct code, count, width, convert_func_pair)
+       with count 0 for char arrays that are returned as strings
+    """
+    fields = []
+    num = 0
+    for f in self._format:
+      full_type_name = f[0]
+      name = prefix + f[1]
+      comp = full_type_name.split('|')
+      array_mult = 1
+      for m in comp[1:]:
+        array_mult *= int(m)
+      sub_type = self._sub_types[num]
+      # pointer
+      if self._pointers[num]:
+        fields.append((name, '%dI' % array_mult, array_mult, 2, None))
+      # embedded struct(s)
+      elif sub_type != None:
+        if array_mult == 1:
+          fields += sub_type._gen_fields(name + ".")
+        else:
+          for i in xrange(array_mult):
+            fields += sub_type._gen_fields("%s[%d]." % (name, i))
+      # base type
+      else:
+        width, conv = self._types[self._gen_pure_name(full_type_name)]
+        if width == 0 and array_mult > 1:
+          fields.append((name, '%ds' % array_mult, 0, 0, None))
+        else:
+          code = ('B','H','I')[width]
+          fields.append((name, '%d%s' % (array_mult, code), array_mult, width, conv))
+      num += 1
+    return fields
+
+  def _gen_pack_funcs(self):
+    """generate unpack_all(data) and pack_all(values) for this struct.
+       unpack_all returns a dict with all base fields of the struct and
+       pack_all creates the struct data from such a dict. missing values
+       are written as zero.
+    """
+    fields = self._gen_fields()
+    fmt = ">" + "".join(map(lambda x: x[1], fields))
+    masks = (0xff, 0xffff, 0xffffffff)
+    convs = []
+    r_code = ["def unpack_all(data):", "  v = fmt.unpack(data)", "  return {"]
+    w_code = ["def pack_all(values):", "  g = values.get", "  return fmt.pack("]
+    pos = 0
+    for name, code, count, width, conv in fields:
+      # string
+      if count == 0:
+        r_code.append("    %r : v[%d]," % (name, pos))
+        w_code.append("    g(%r, ''), " % name)
+        pos += 1
+        continue
+      mask = masks[width]
+      if conv != None:
+        idx = len(convs)
+        convs.append(conv)
+        r_val = "convs[%d][1](v[%%d])" % idx
+        w_val = "convs[%d][0](%%s) & 0x%x" % (idx, mask)
+      else:
+        r_val = "v[%d]"
+        w_val = "%%s & 0x%x" % mask
+      if count == 1:
+        r_code.append("    %r : %s," % (name, r_val % pos))
+        w_code.append("    %s, " % (w_val % ("g(%r, 0)" % name)))
+      else:
+        items = map(lambda i: r_val % (pos + i), xrange(count))
+        r_code.append("    %r : [%s]," % (name, ", ".join(items)))
+        for i in xrange(count):
+          w_code.append("    %s, " % (w_val % ("g(%r, (0,)*%d)[%d]" % (name, count, i))))
+      pos += count
+    r_code.append("  }")
+    w_code.append("  )")
+    # generate code
+    l = { 'fmt' : struct.Struct(fmt), 'convs' : convs }
+    exec "\n".join(r_code) in l
+    exec "\n".join(w_code) in l
+    self._struct = l['fmt']
+    self.unpack_all = l['unpack_all']
+    self.pack_all = l['pack_all']
   
   def _get_offset_loop(self, parts, base=0):
     name = parts[0]
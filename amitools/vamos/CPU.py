@@ -39,12 +39,18 @@ class CPU:
     pass
   def execute(self, num_cycles):
     return 0
+  def get_cycles_run(self):
+    return 0
   def end(self):
     pass
-  def trap_setup(self, func, auto_rts=False, one_shot=False):
+  def trap_setup(self, func, auto_rts=False, one_shot=False, snap_regs=False):
     return -1
   def trap_free(self, tid):
     pass
+  def get_trap_regs(self):
+    return None
+  def get_trap_count(self):
+    return 0
 
   sr_chars = "CVZNX"
   
@@ -1,4 +1,5 @@
 import logging
+import bisect
 from Log import *
 
 MEMORY_WIDTH_BYTE = 0
@@ -6,46 +7,127 @@ MEMORY_WIDTH_WORD = 1
 MEMORY_WIDTH_LONG = 2
 
 class LabelManager:
+  """keep all memory labels and find them by address.
+
+     The labels are kept in an interval index: sorted by begin address with
+     a running maximum of all end addresses. A lookup bisects to the last
+     label beginning before the address and then walks back only as long as
+     earlier labels could still reach the address. For the usual disjoint
+     labels this is a single check.
+  """
   trace_val_str = ( "%02x      ", "%04x    ", "%08x" )
   
   def __init__(self):
+    # parallel lists sorted by begin address
+    self.begins = []
     self.ranges = []
+    self.max_ends = []
+    # insertion order of labels: earlier labels take precedence on overlap
+    self.seqs = {}
+    self.next_seq = 0
     self.error_tracker = None # will be set later
   
   def add_label(self, range):
-    self.ranges.append(range)
+    addr = range.addr
+    pos = bisect.bisect_right(self.begins, addr)
+    self.begins.insert(pos, addr)
+    self.ranges.insert(pos, range)
+    self.seqs[id(range)] = self.next_seq
+    self.next_seq += 1
+    # update running max of end addresses
+    end = range.end
+    if pos > 0 and self.max_ends[pos-1] > end:
+      end = self.max_ends[pos-1]
+    self.max_ends.insert(pos, end)
+    max_ends = self.max_ends
+    n = len(max_ends)
+    pos += 1
+    while pos < n and max_ends[pos] < end:
+      max_ends[pos] = end
+      pos += 1
   
+  def _find_label_pos(self, range):
+    pos = bisect.bisect_left(self.begins, range.addr)
+    n = len(self.ranges)
+    while pos < n and self.begins[pos] == range.addr:
+      if self.ranges[pos] is range:
+        return pos
+      pos += 1
+    return -1
+
+  def _del_label_pos(self, pos):
+    range = self.ranges[pos]
+    del self.begins[pos]
+    del self.ranges[pos]
+    del self.max_ends[pos]
+    del self.seqs[id(range)]
+    # fix running max of end addresses until it is unchanged again
+    max_ends = self.max_ends
+    ranges = self.ranges
+    n = len(max_ends)
+    if pos > 0:
+      end = max_ends[pos-1]
+    else:
+      end = 0
+    while pos < n:
+      r_end = ranges[pos].end
+      if r_end > end:
+        end = r_end
+      if max_ends[pos] == end:
+        break
+      max_ends[pos] = end
+      pos += 1
+
   def remove_label(self, range):
-    if range in self.ranges:
-      self.ranges.remove(range)
+    pos = self._find_label_pos(range)
+    if pos != -1:
+      self._del_label_pos(pos)
     else:
       # try to find compatible
-      for r in self.ranges:
+      for r in self.get_intersecting_labels(range.addr, range.size):
         if r.addr == range.addr and r.size == range.size:
-          self.ranges.remove(r)
+          self._del_label_pos(self._find_label_pos(r))
           log_mem_int.log(logging.WARN, "remove_label: got=%s have=%s", range, r)
           return
       log_mem_int.log(logging.ERROR, "remove_label: invalid range %s", range)
   
+  def _sort_by_seq(self, ranges):
+    seqs = self.seqs
+    return sorted(ranges, key=lambda r: seqs[id(r)])
+
   def get_all_labels(self):
-    return self.ranges[:]
+    return self._sort_by_seq(self.ranges)
   
   def dump(self):
-    for r in self.ranges:
+    for r in self.get_all_labels():
       print r
   
   def get_label(self, addr):
-    for r in self.ranges:
+    pos = bisect.bisect_right(self.begins, addr) - 1
+    ranges = self.ranges
+    max_ends = self.max_ends
+    result = None
+    while pos >= 0 and max_ends[pos] > addr:
+      r = ranges[pos]
       if r.is_inside(addr):
-        return r
-    return None
+        # overlapping labels: keep the first added one
+        if result == None or self.seqs[id(r)] < self.seqs[id(result)]:
+          result = r
+      pos -= 1
+    return result
 
   def get_intersecting_labels(self, addr, size):
+    # does_intersect() also reports labels only touching the range
+    pos = bisect.bisect_right(self.begins, addr + size) - 1
+    ranges = self.ranges
+    max_ends = self.max_ends
     result = []
-    for r in self.ranges:
-      if r.does_intersect(addr,size):
+    while pos >= 0 and max_ends[pos] >= addr:
+      r = ranges[pos]
+      if r.does_intersect(addr, size):
         result.append(r)
-    return result
+      pos -= 1
+    return self._sort_by_seq(result)
 
   def get_label_offset(self, addr):
     r = self.get_label(addr)
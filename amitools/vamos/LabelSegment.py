@@ -0,0 +1,60 @@
+import bisect
+
+from LabelRange import LabelRange
+
+class LabelSegment(LabelRange):
+  """the label of a loaded segment.
+
+     it additionally keeps the symbols (HUNK_SYMBOL) and the source line
+     info (HUNK_DEBUG LINE) of the hunk so addresses inside the segment can
+     be resolved. all offsets are relative to the begin of the segment data
+     that follows the size and next pointer of the segment.
+  """
+  def __init__(self, name, addr, size, seg_type, data_offset=8):
+    LabelRange.__init__(self, name, addr, size)
+    self.seg_type = seg_type
+    self.data_addr = addr + data_offset
+    # sorted offsets and names of symbols
+    self.sym_offsets = []
+    self.sym_names = []
+    # sorted offsets and (src_file, line) of source lines
+    self.line_offsets = []
+    self.line_infos = []
+
+  def is_code(self):
+    return self.seg_type == 'code'
+
+  def set_symbols(self, symbols):
+    """set symbols from a list of (name, offset)"""
+    entries = sorted(map(lambda x: (x[1], x[0]), symbols))
+    self.sym_offsets = map(lambda x: x[0], entries)
+    self.sym_names = map(lambda x: x[1], entries)
+
+  def add_src_lines(self, src_file, base_offset, src_map):
+    """add the [line, offset] entries of a LINE debug hunk"""
+    entries = zip(self.line_offsets, self.line_infos)
+    for line, offset in src_map:
+      # upper byte may hold flags in some compilers' output
+      entries.append((base_offset + offset, (src_file, line & 0xffffff)))
+    entries.sort()
+    self.line_offsets = map(lambda x: x[0], entries)
+    self.line_infos = map(lambda x: x[1], entries)
+
+  def has_debug_info(self):
+    return len(self.sym_offsets) > 0 or len(self.line_offsets) > 0
+
+  def get_symbol(self, addr):
+    """return (name, delta) of the symbol covering addr or None"""
+    offset = addr - self.data_addr
+    pos = bisect.bisect_right(self.sym_offsets, offset) - 1
+    if pos < 0:
+      return None
+    return (self.sym_names[pos], offset - self.sym_offsets[pos])
+
+  def get_src_line(self, addr):
+    """return (src_file, line) of the code at addr or None"""
+    offset = addr - self.data_addr
+    pos = bisect.bisect_right(self.line_offsets, offset) - 1
+    if pos < 0:
+      return None
+    return self.line_infos[pos]
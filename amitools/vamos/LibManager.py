@@ -29,6 +29,8 @@ class LibManager():
     # use fast call? -> if lib logging level is ERROR or OFF
     self.log_call = log_lib.isEnabledFor(logging.WARN)
     self.benchmark = cfg.benchmark
+    # profile all libs if a profile file is written
+    self.profile_all = cfg.profile_file != None
 
     # libs will accumulate this if benchmarking is enabled
     self.bench_total = 0.0
@@ -46,6 +48,8 @@ class LibManager():
     # init lib class instance
     lib.log_call = self.log_call
     lib.benchmark = self.benchmark
+    if self.profile_all:
+      lib.profile = True
     lib.lib_mgr = self
     
   def unregister_vamos_lib(self, lib):
@@ -8,7 +8,6 @@ from Exceptions import *
 from lib.dos.AmiTime import *
 from lib.dos.DosStruct import *
 from lib.dos.Error import *
-from AccessStruct import AccessStruct
 from lib.dos.DosProtection import DosProtection
 
 class AmiLock:
@@ -136,17 +135,17 @@ class LockManager(LabelRange):
       self._unregister_lock(lock)
 
   def examine_lock(self, lock, fib_mem):
-    # name
-    name_addr = fib_mem.s_get_addr('fib_FileName')
-    fib_mem.w_cstr(name_addr, lock.name)
-    # dummy key
-    fib_mem.w_s('fib_DiskKey',0xcafebabe)
+    # name and dummy key
+    fib = {
+      'fib_FileName' : lock.name,
+      'fib_DiskKey' : 0xcafebabe
+    }
     # type
     if os.path.isdir(lock.sys_path):
       dirEntryType = 0x2 # dir
     else:
       dirEntryType = 0xfffffffd # file
-    fib_mem.w_s('fib_DirEntryType', dirEntryType )
+    fib['fib_DirEntryType'] = dirEntryType
     # protection
     prot = DosProtection(0)
     try:
@@ -161,19 +160,19 @@ class LockManager(LabelRange):
       log_lock.debug("examine lock: '%s' mode=%03o: prot=%s", lock, mode, prot)
     except OSError:
       return ERROR_OBJECT_IN_USE
-    fib_mem.w_s('fib_Protection', prot.mask)
+    fib['fib_Protection'] = prot.mask
     # size
     if os.path.isfile(lock.sys_path):
       size = os.path.getsize(lock.sys_path)
-      fib_mem.w_s('fib_Size', size)
+      fib['fib_Size'] = size
     # date (use mtime here)
-    date_addr = fib_mem.s_get_addr('fib_Date')
-    date = AccessStruct(fib_mem.mem, DateStampDef, date_addr)
     t = os.path.getmtime(lock.sys_path)
     at = sys_to_ami_time(t)
-    date.w_s('ds_Days', at.tday)
-    date.w_s('ds_Minute', at.tmin)
-    date.w_s('ds_Tick', at.tick)
+    fib['fib_Date.ds_Days'] = at.tday
+    fib['fib_Date.ds_Minute'] = at.tmin
+    fib['fib_Date.ds_Tick'] = at.tick
+    # write whole block in one go
+    fib_mem.write_all(fib)
     return NO_ERROR
 
     
@@ -15,6 +15,8 @@ class MEM:
     pass
   def clear_ram_block(self,addr,size,value):
     pass
+  def get_ram_buffer(self):
+    return None
   def reserve_special_range(self,num_pages):
     return 0
   def set_special_range_read_func(self,page_addr, width, func):
@@ -13,10 +13,18 @@ from AccessMemory import AccessMemory
 class MainMemory:
   
   op_reset = 0x04e70
+
+  # big endian access formats and value masks for byte, word, long
+  _formats = (struct.Struct(">B"), struct.Struct(">H"), struct.Struct(">I"))
+  _masks = (0xff, 0xffff, 0xffffffff)
+  # chunk size used to search the end of a C string
+  _cstr_chunk = 256
   
   def __init__(self, raw_mem, error_tracker):
     self.raw_mem = raw_mem
     self.error_tracker = error_tracker
+    # the RAM of the CPU emulator directly mapped as a char array
+    self.ram = raw_mem.get_ram_buffer()
     self.access = AccessMemory(self)
   
   # reserve special range -> begin_addr
@@ -44,10 +52,30 @@ class MainMemory:
       addr += 0x10000
 
   def read_mem(self, width, addr):
-    return self.raw_mem.read_ram(width, addr)
+    return self._formats[width].unpack_from(self.ram, addr)[0]
     
   def write_mem(self, width, addr, val):
-    self.raw_mem.write_ram(width, addr, val)
+    self._formats[width].pack_into(self.ram, addr, val & self._masks[width])
+
+  def read_data(self, addr, size):
+    return self.ram[addr:addr+size]
+
+  def write_data(self, addr, data):
+    self.ram[addr:addr+len(data)] = data
+
+  def read_cstr(self, addr):
+    # search NUL in chunks to avoid slicing large parts of the RAM
+    off = addr
+    chunk = self._cstr_chunk
+    while True:
+      data = self.ram[off:off+chunk]
+      pos = data.find('\0')
+      if pos != -1:
+        return self.ram[addr:off+pos]
+      if len(data) < chunk:
+        raise VamosInternalError("Unterminated C string at %06x" % addr)
+      off += chunk
+      chunk *= 2
 
   def read_block(self, addr, size, data):
     self.raw_mem.read_ram_block(addr,size,data)
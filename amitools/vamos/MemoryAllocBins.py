@@ -0,0 +1,138 @@
+import bisect
+
+from Exceptions import *
+from Log import log_mem_alloc
+from MemoryAlloc import MemoryAlloc
+
+# number of size classes: a free chunk of size s is stored in bin s.bit_length()
+NUM_BINS = 33
+
+class MemoryAllocBins(MemoryAlloc):
+  """an alternative allocator engine using segregated size class bins.
+
+     Each bin keeps a sorted list of (size, addr) tuples for all free chunks
+     of its size class so a best fit is found with a bisect. For coalescing
+     the free chunks are additionally indexed by their begin and end address
+     so neighbours of a free'd block are found without walking a list.
+  """
+  def __init__(self, mem, addr, size, begin, label_mgr):
+    MemoryAlloc.__init__(self, mem, addr, size, begin, label_mgr)
+    # the base class setup a single free chunk - move it into the bins
+    self.free_first = None
+    self.bins = []
+    for i in xrange(NUM_BINS):
+      self.bins.append([])
+    self.free_by_begin = {}
+    self.free_by_end = {}
+    self.free_entries = 0
+    self._add_free(addr + begin, self.free_bytes)
+
+  def _get_bin(self, size):
+    return self.bins[size.bit_length()]
+
+  def _add_free(self, addr, size):
+    bisect.insort(self._get_bin(size), (size, addr))
+    self.free_by_begin[addr] = size
+    self.free_by_end[addr + size] = addr
+    self.free_entries += 1
+
+  def _del_free(self, addr, size):
+    b = self._get_bin(size)
+    pos = bisect.bisect_left(b, (size, addr))
+    del b[pos]
+    del self.free_by_begin[addr]
+    del self.free_by_end[addr + size]
+    self.free_entries -= 1
+
+  def _find_best_chunk(self, size):
+    """find best chunk that could take the given alloc
+       return: (addr, chunk size) of chunk or (None, -1) if none found
+    """
+    idx = size.bit_length()
+    # first look in own size class: there the best fit is found by bisect
+    b = self.bins[idx]
+    pos = bisect.bisect_left(b, (size, 0))
+    if pos < len(b):
+      chunk_size, addr = b[pos]
+      return (addr, chunk_size)
+    # all larger classes fit: take smallest chunk of first non-empty one
+    idx += 1
+    while idx < NUM_BINS:
+      b = self.bins[idx]
+      if len(b) > 0:
+        chunk_size, addr = b[0]
+        return (addr, chunk_size)
+      idx += 1
+    return (None, -1)
+
+  def alloc_mem(self, size):
+    """allocate memory and return addr or 0 if no more memory"""
+    # align size to 4 bytes
+    size = (size + 3) & ~3
+    # find best free chunk
+    addr, chunk_size = self._find_best_chunk(size)
+    # out of memory?
+    if addr == None:
+      log_mem_alloc.warn("[alloc: NO MEMORY for %06x bytes]", size)
+      return 0
+    # remove chunk from bins and re-add the part that is left
+    self._del_free(addr, chunk_size)
+    left = chunk_size - size
+    if left > 0:
+      self._add_free(addr + size, left)
+    # add to valid allocs map
+    self.addrs[addr] = size
+    self.free_bytes -= size
+    # erase memory
+    self.mem.clear_block(addr, size, 0)
+    log_mem_alloc.info("[alloc @%06x-%06x: %06x bytes] %s", addr, addr+size, size, self._stat_info())
+    return addr
+
+  def free_mem(self, addr, size):
+    # first check if its a right alloc
+    if not self.addrs.has_key(addr):
+      raise VamosInternalError("Invalid Free'd Memory at %06x" % addr)
+    real_size = self.addrs[addr]
+    # remove from valid allocs
+    del self.addrs[addr]
+    self.free_bytes += real_size
+
+    # merge with free chunk right before
+    begin = addr
+    end = addr + real_size
+    if self.free_by_end.has_key(begin):
+      prev_addr = self.free_by_end[begin]
+      prev_size = self.free_by_begin[prev_addr]
+      self._del_free(prev_addr, prev_size)
+      log_mem_alloc.debug("merged: [@%06x +%06x] + this", prev_addr, prev_size)
+      begin = prev_addr
+    # merge with free chunk right after
+    if self.free_by_begin.has_key(end):
+      next_size = self.free_by_begin[end]
+      self._del_free(end, next_size)
+      log_mem_alloc.debug("merged: this + [@%06x +%06x]", end, next_size)
+      end += next_size
+    self._add_free(begin, end - begin)
+
+    log_mem_alloc.info("[free  @%06x-%06x: %06x bytes] %s", addr, addr+real_size, real_size, self._stat_info())
+
+  def _get_free_chunks(self):
+    """return a list of (addr, size) of all free chunks sorted by address"""
+    return sorted(self.free_by_begin.items())
+
+  def dump_mem_state(self):
+    num = 0
+    for addr, size in self._get_free_chunks():
+      log_mem_alloc.debug("dump #%02d: [@%06x +%06x %06x]" % (num, addr, size, addr+size))
+      num += 1
+
+  def dump_orphans(self):
+    last = self.addr + self.begin
+    for addr, size in self._get_free_chunks():
+      if addr != last:
+        self._dump_orphan(last, addr - last)
+      last = addr + size
+    # orphan at end?
+    end = self.addr + self.size
+    if last != end:
+      self._dump_orphan(last, end - last)
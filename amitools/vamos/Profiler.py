@@ -0,0 +1,135 @@
+import json
+
+from Log import log_prof
+
+class Profiler:
+  """collect library call profiles and attribute native m68k cycles.
+
+     Every profiled library call reports its host time and the current
+     m68k cycle counter. The cycles executed since the last library call
+     are native m68k code and accounted to the segment/hunk label of the
+     caller's return address.
+  """
+  def __init__(self, label_mgr):
+    self.label_mgr = label_mgr
+    # (lib, func) -> [calls, host time, cycles before call]
+    self.funcs = {}
+    # caller -> native cycles
+    self.callers = {}
+    # (caller, lib, func) -> [calls, host time]
+    self.edges = {}
+    self.last_cycles = 0
+    self.last_caller = None
+
+  def _get_caller_name(self, caller_pc):
+    label = self.label_mgr.get_label(caller_pc)
+    if label != None:
+      return label.name
+    else:
+      return "@%06x" % caller_pc
+
+  def account_call(self, lib_name, func_name, caller_pc, host_time, cycles):
+    """account a library call that was entered at the given cycle count"""
+    caller = self._get_caller_name(caller_pc)
+    native = cycles - self.last_cycles
+    self.last_cycles = cycles
+    self.last_caller = caller
+    # native code run before the call
+    self.callers[caller] = self.callers.get(caller, 0) + native
+    # function
+    key = (lib_name, func_name)
+    if self.funcs.has_key(key):
+      entry = self.funcs[key]
+      entry[0] += 1
+      entry[1] += host_time
+      entry[2] += native
+    else:
+      self.funcs[key] = [1, host_time, native]
+    # call edge
+    key = (caller, lib_name, func_name)
+    if self.edges.has_key(key):
+      entry = self.edges[key]
+      entry[0] += 1
+      entry[1] += host_time
+    else:
+      self.edges[key] = [1, host_time]
+
+  def finish(self, total_cycles):
+    """account the native cycles after the last call to its caller"""
+    caller = self.last_caller
+    if caller == None:
+      caller = "<main>"
+    native = total_cycles - self.last_cycles
+    self.last_cycles = total_cycles
+    self.callers[caller] = self.callers.get(caller, 0) + native
+
+  def dump(self):
+    log_prof.info("Native m68k Cycles by Caller")
+    for caller in sorted(self.callers, key=lambda x: -self.callers[x]):
+      log_prof.info("  %30s: %12d cycles", caller, self.callers[caller])
+    log_prof.info("Library Function Call Profile")
+    for key in sorted(self.funcs, key=lambda x: -self.funcs[x][1]):
+      calls, host_time, cycles = self.funcs[key]
+      log_prof.info("  %16s %20s: #%8d  total=%10.4f  per call=%10.6f  cycles before=%d", \
+        key[0], key[1], calls, host_time, host_time / calls, cycles)
+
+  def get_data(self):
+    """return the profile as a dictionary suitable for JSON export"""
+    funcs = []
+    for key in sorted(self.funcs):
+      calls, host_time, cycles = self.funcs[key]
+      funcs.append({'lib' : key[0], 'func' : key[1], 'calls' : calls,
+                    'host_time' : host_time, 'cycles_before' : cycles})
+    callers = []
+    for caller in sorted(self.callers):
+      callers.append({'caller' : caller, 'cycles' : self.callers[caller]})
+    edges = []
+    for key in sorted(self.edges):
+      calls, host_time = self.edges[key]
+      edges.append({'caller' : key[0], 'lib' : key[1], 'func' : key[2],
+                    'calls' : calls, 'host_time' : host_time})
+    return {'funcs' : funcs, 'callers' : callers, 'calls' : edges}
+
+  def write_json(self, file_name):
+    f = open(file_name, "w")
+    json.dump(self.get_data(), f, indent=2, sort_keys=True)
+    f.close()
+
+  def write_callgrind(self, file_name):
+    """write a callgrind file: events are m68k cycles and host time in us"""
+    f = open(file_name, "w")
+    f.write("version: 1\n")
+    f.write("creator: vamos\n")
+    f.write("positions: line\n")
+    f.write("events: Cycles HostTime_us\n\n")
+    # callers with native cycles and calls to lib functions
+    caller_edges = {}
+    for caller in self.callers:
+      caller_edges[caller] = []
+    for key in sorted(self.edges):
+      caller_edges.setdefault(key[0], []).append(key)
+    for caller in sorted(caller_edges):
+      f.write("fl=%s\n" % caller)
+      f.write("fn=%s\n" % caller)
+      f.write("0 %d 0\n" % self.callers.get(caller, 0))
+      for key in caller_edges[caller]:
+        calls, host_time = self.edges[key]
+        f.write("cfl=%s\n" % key[1])
+        f.write("cfn=%s:%s\n" % (key[1], key[2]))
+        f.write("calls=%d 0\n" % calls)
+        f.write("0 0 %d\n" % int(host_time * 1000000))
+      f.write("\n")
+    # lib functions with their own host time
+    for key in sorted(self.funcs):
+      calls, host_time, cycles = self.funcs[key]
+      f.write("fl=%s\n" % key[0])
+      f.write("fn=%s:%s\n" % key)
+      f.write("0 0 %d\n\n" % int(host_time * 1000000))
+    f.close()
+
+  def write(self, file_name, file_format):
+    if file_format == 'callgrind':
+      self.write_callgrind(file_name)
+    else:
+      self.write_json(file_name)
+    log_prof.info("wrote %s profile: %s", file_format, file_name)
@@ -0,0 +1,129 @@
+import struct
+
+from LabelSegment import LabelSegment
+from Log import log_prof
+
+class Sampler:
+  """a sampling profiler for the emulated m68k code.
+
+     The run loop reports the PC and stack pointer after every sample slice.
+     The PC is accounted flat to the symbol and source line it belongs to.
+     For the cumulative counts the stack is scanned for return addresses,
+     i.e. longs pointing into a code segment right behind a JSR or BSR.
+     Each symbol or line found on the stack is counted once per sample.
+  """
+
+  # how far the stack is scanned for return addresses
+  max_stack_longs = 256
+  max_frames = 32
+
+  def __init__(self, label_mgr, mem):
+    self.label_mgr = label_mgr
+    self.mem = mem
+    self.num_samples = 0
+    # symbol -> [flat, cumulative]
+    self.symbols = {}
+    # (src_file, line) -> [flat, cumulative]
+    self.lines = {}
+
+  def _resolve(self, addr):
+    """return (symbol, line) for an address. line is None if unknown"""
+    label = self.label_mgr.get_label(addr)
+    if label == None:
+      return ("@%06x" % addr, None)
+    if isinstance(label, LabelSegment):
+      line = label.get_src_line(addr)
+      sym = label.get_symbol(addr)
+      if sym != None:
+        return ("%s (%s)" % (sym[0], label.name), line)
+      else:
+        return (label.name, line)
+    return (label.name, None)
+
+  def _is_call_return(self, label, addr):
+    """check if a JSR or BSR is found right before addr"""
+    if addr & 1 or addr - 6 < label.data_addr:
+      return False
+    w6, w4, w2 = struct.unpack(">HHH", self.mem.read_data(addr - 6, 6))
+    # bsr.b, jsr (An)
+    if (w2 & 0xff00 == 0x6100 and w2 & 0xff not in (0, 0xff)) or w2 & 0xfff8 == 0x4e90:
+      return True
+    # bsr.w, jsr d16(An), d8(An,Xn), abs.w, d16(PC), d8(PC,Xn)
+    if w4 == 0x6100 or (w4 >= 0x4ea8 and w4 <= 0x4ebb and w4 != 0x4eb9):
+      return True
+    # bsr.l, jsr abs.l
+    return w6 == 0x61ff or w6 == 0x4eb9
+
+  def _get_return_addrs(self, sp, stack_top):
+    """scan the stack from sp up to stack_top for return addresses"""
+    result = []
+    if sp & 1 or sp >= stack_top:
+      return result
+    num = (stack_top - sp) / 4
+    if num > self.max_stack_longs:
+      num = self.max_stack_longs
+    longs = struct.unpack(">%dI" % num, self.mem.read_data(sp, num * 4))
+    for val in longs:
+      label = self.label_mgr.get_label(val)
+      if label != None and isinstance(label, LabelSegment) and label.is_code():
+        if self._is_call_return(label, val):
+          # account the call instruction not the return address
+          result.append(val - 2)
+          if len(result) == self.max_frames:
+            break
+    return result
+
+  def _count(self, table, key, flat):
+    if table.has_key(key):
+      entry = table[key]
+    else:
+      entry = [0, 0]
+      table[key] = entry
+    if flat:
+      entry[0] += 1
+    entry[1] += 1
+
+  def sample(self, pc, sp, stack_top):
+    """record a sample of the current PC and the stack"""
+    self.num_samples += 1
+    sym, line = self._resolve(pc)
+    self._count(self.symbols, sym, True)
+    if line != None:
+      self._count(self.lines, line, True)
+    # cumulative: count every caller once
+    seen_syms = set([sym])
+    seen_lines = set([line])
+    for addr in self._get_return_addrs(sp, stack_top):
+      sym, line = self._resolve(addr)
+      if sym not in seen_syms:
+        seen_syms.add(sym)
+        self._count(self.symbols, sym, False)
+      if line != None and line not in seen_lines:
+        seen_lines.add(line)
+        self._count(self.lines, line, False)
+
+  def _dump_table(self, title, table, names, sort_col, max_entries):
+    total = self.num_samples
+    log_prof.info("%s", title)
+    log_prof.info("  %8s %7s %8s %7s  %s", "flat", "flat%", "cum", "cum%", "name")
+    keys = sorted(table, key=lambda x: (-table[x][sort_col], names[x]))
+    for key in keys[:max_entries]:
+      flat, cum = table[key]
+      log_prof.info("  %8d %6.2f%% %8d %6.2f%%  %s", flat, flat * 100.0 / total, cum, cum * 100.0 / total, names[key])
+
+  def dump(self, max_entries=30):
+    if self.num_samples == 0:
+      log_prof.info("no PC samples taken")
+      return
+    log_prof.info("PC Sample Profile: %d samples", self.num_samples)
+    sym_names = {}
+    for sym in self.symbols:
+      sym_names[sym] = sym
+    self._dump_table("Hot Spots by Symbol (flat)", self.symbols, sym_names, 0, max_entries)
+    self._dump_table("Hot Spots by Symbol (cumulative)", self.symbols, sym_names, 1, max_entries)
+    if len(self.lines) > 0:
+      line_names = {}
+      for line in self.lines:
+        line_names[line] = "%s:%d" % line
+      self._dump_table("Hot Spots by Source Line (flat)", self.lines, line_names, 0, max_entries)
+      self._dump_table("Hot Spots by Source Line (cumulative)", self.lines, line_names, 1, max_entries)
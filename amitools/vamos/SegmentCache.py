@@ -0,0 +1,200 @@
+import os
+import struct
+import hashlib
+
+from amitools.hunk import Hunk
+from amitools.hunk.HunkRelocate import HunkRelocate
+from Log import log_main
+
+class CachedHunkFile:
+  """stands in for a HunkReader with the segments restored from the cache"""
+  def __init__(self, segments):
+    self.segments = segments
+    self.type = Hunk.TYPE_LOADSEG
+
+class SegmentCache:
+  """an on-disk cache for the parsed segments of loadseg()able hunk files.
+
+     The cache file of a binary is named after the hash of its path and
+     stores the mtime, size and SHA1 of the binary it was created from.
+     A cached entry is only used if all of them still match.
+
+     For each segment the hunk type, alloc size, the unrelocated data, the
+     merged relocation table and the symbols and source lines are stored
+     in a compact big endian binary format. Loading a cached binary then
+     only needs a memory copy and the relocation pass.
+  """
+
+  magic = "VSEG"
+  version = 1
+
+  _header = struct.Struct(">4sIIII20s")
+  _seg = struct.Struct(">IIII")
+  _u32x2 = struct.Struct(">II")
+
+  def __init__(self, cache_dir):
+    self.cache_dir = cache_dir
+    self.hits = 0
+    self.misses = 0
+
+  def _get_cache_file(self, sys_bin_file):
+    key = hashlib.sha1(os.path.abspath(sys_bin_file)).hexdigest()
+    return os.path.join(self.cache_dir, key + ".seg")
+
+  def _get_file_key(self, sys_bin_file):
+    """return (mtime, size, sha1) of the binary"""
+    st = os.stat(sys_bin_file)
+    f = open(sys_bin_file, "rb")
+    digest = hashlib.sha1(f.read()).digest()
+    f.close()
+    return (int(st.st_mtime), st.st_size, digest)
+
+  # ----- load -----
+
+  def load(self, sys_bin_file):
+    """return a hunk file like object with the segments or None"""
+    cache_file = self._get_cache_file(sys_bin_file)
+    if not os.path.isfile(cache_file):
+      self.misses += 1
+      return None
+    try:
+      f = open(cache_file, "rb")
+      data = f.read()
+      f.close()
+      segments = self._decode(data, self._get_file_key(sys_bin_file))
+    except (IOError, OSError, struct.error), e:
+      log_main.warn("seg cache: can't read '%s': %s", cache_file, e)
+      segments = None
+    if segments == None:
+      self.misses += 1
+      return None
+    self.hits += 1
+    log_main.info("seg cache: hit for '%s'", sys_bin_file)
+    return CachedHunkFile(segments)
+
+  def _read_str(self, data, pos):
+    n = struct.unpack_from(">H", data, pos)[0]
+    pos += 2
+    return (data[pos:pos+n], pos + n)
+
+  def _read_longs(self, data, pos, num):
+    return (list(struct.unpack_from(">%dI" % num, data, pos)), pos + num * 4)
+
+  def _decode(self, data, file_key):
+    magic, version, mtime, size, num_segs, digest = self._header.unpack_from(data, 0)
+    if magic != self.magic or version != self.version:
+      return None
+    # stale entry?
+    if (mtime, size, digest) != file_key:
+      return None
+    pos = self._header.size
+    segments = []
+    for hunk_no in xrange(num_segs):
+      hunk_type, alloc_size, data_size, num_relocs = self._seg.unpack_from(data, pos)
+      pos += self._seg.size
+      main_hunk = {
+        'type' : hunk_type,
+        'type_name' : Hunk.hunk_names[hunk_type],
+        'hunk_no' : hunk_no,
+        'alloc_size' : alloc_size,
+        'size' : data_size
+      }
+      if hunk_type != Hunk.HUNK_BSS:
+        main_hunk['data'] = data[pos:pos+data_size]
+        pos += data_size
+      segment = [main_hunk]
+      # relocations
+      if num_relocs > 0:
+        reloc = {}
+        for i in xrange(num_relocs):
+          hunk_num, count = self._u32x2.unpack_from(data, pos)
+          pos += self._u32x2.size
+          reloc[hunk_num], pos = self._read_longs(data, pos, count)
+        segment.append({'type' : Hunk.HUNK_ABSRELOC32, 'type_name' : 'HUNK_ABSRELOC32', 'reloc' : reloc})
+      # symbols
+      num_syms = struct.unpack_from(">I", data, pos)[0]
+      pos += 4
+      if num_syms > 0:
+        symbols = []
+        for i in xrange(num_syms):
+          name, pos = self._read_str(data, pos)
+          value = struct.unpack_from(">I", data, pos)[0]
+          pos += 4
+          symbols.append((name, value))
+        segment.append({'type' : Hunk.HUNK_SYMBOL, 'type_name' : 'HUNK_SYMBOL', 'symbols' : symbols})
+      # source lines
+      num_debug = struct.unpack_from(">I", data, pos)[0]
+      pos += 4
+      for i in xrange(num_debug):
+        src_file, pos = self._read_str(data, pos)
+        offset, count = self._u32x2.unpack_from(data, pos)
+        pos += self._u32x2.size
+        longs, pos = self._read_longs(data, pos, count * 2)
+        src_map = [list(x) for x in zip(longs[0::2], longs[1::2])]
+        segment.append({'type' : Hunk.HUNK_DEBUG, 'type_name' : 'HUNK_DEBUG', 'debug_type' : 'LINE',
+                        'debug_offset' : offset, 'src_file' : src_file, 'src_map' : src_map})
+      segments.append(segment)
+    return segments
+
+  # ----- save -----
+
+  def save(self, sys_bin_file, hunk_file):
+    """store the segments of a loaded hunk file in the cache"""
+    cache_file = self._get_cache_file(sys_bin_file)
+    try:
+      mtime, size, digest = self._get_file_key(sys_bin_file)
+      data = self._encode(hunk_file.segments, mtime, size, digest)
+      if not os.path.isdir(self.cache_dir):
+        os.makedirs(self.cache_dir)
+      # write to a temp file first so concurrent runs never see partial files
+      tmp_file = "%s.%d" % (cache_file, os.getpid())
+      f = open(tmp_file, "wb")
+      f.write(data)
+      f.close()
+      os.rename(tmp_file, cache_file)
+      log_main.info("seg cache: stored '%s'", sys_bin_file)
+    except (IOError, OSError), e:
+      log_main.warn("seg cache: can't write '%s': %s", cache_file, e)
+
+  def _write_str(self, out, s):
+    out.append(struct.pack(">H", len(s)))
+    out.append(s)
+
+  def _encode(self, segments, mtime, size, digest):
+    out = [self._header.pack(self.magic, self.version, mtime, size, len(segments), digest)]
+    relocator = HunkRelocate(None)
+    for segment in segments:
+      main_hunk = segment[0]
+      # merge relocations of all reloc hunks
+      reloc = relocator.get_relocs(segment)
+      symbols = []
+      debug = []
+      for hunk in segment[1:]:
+        hunk_type = hunk['type']
+        if hunk_type == Hunk.HUNK_SYMBOL:
+          symbols += hunk['symbols']
+        elif hunk_type == Hunk.HUNK_DEBUG and hunk['debug_type'] == 'LINE':
+          debug.append(hunk)
+      data = main_hunk.get('data', '')
+      out.append(self._seg.pack(main_hunk['type'], main_hunk['alloc_size'], len(data), len(reloc)))
+      if main_hunk['type'] != Hunk.HUNK_BSS:
+        out.append(data)
+      for hunk_num in sorted(reloc):
+        offsets = reloc[hunk_num]
+        out.append(self._u32x2.pack(hunk_num, len(offsets)))
+        out.append(struct.pack(">%dI" % len(offsets), *offsets))
+      out.append(struct.pack(">I", len(symbols)))
+      for name, value in symbols:
+        self._write_str(out, name)
+        out.append(struct.pack(">I", value))
+      out.append(struct.pack(">I", len(debug)))
+      for hunk in debug:
+        self._write_str(out, hunk['src_file'])
+        src_map = hunk['src_map']
+        out.append(self._u32x2.pack(hunk['debug_offset'], len(src_map)))
+        longs = []
+        for line, offset in src_map:
+          longs.append(line)
+          longs.append(offset)
+        out.append(struct.pack(">%dI" % len(longs), *longs))
+    return "".join(out)
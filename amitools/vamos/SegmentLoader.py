@@ -4,7 +4,7 @@ from amitools.hunk import Hunk
 from amitools.hunk.HunkReader import HunkReader
 from amitools.hunk.HunkRelocate import HunkRelocate
 from AccessMemory import AccessMemory
-from LabelRange import LabelRange
+from LabelSegment import LabelSegment
 from Log import *
 
 class Segment:
@@ -41,11 +41,12 @@ class SegList:
 
 class SegmentLoader:
   
-  def __init__(self, mem, alloc, label_mgr, path_mgr):
+  def __init__(self, mem, alloc, label_mgr, path_mgr, seg_cache=None):
     self.mem = mem
     self.alloc = alloc
     self.label_mgr = label_mgr
     self.path_mgr = path_mgr
+    self.seg_cache = seg_cache
     self.error = None
     self.loaded_seg_lists = {}
   
@@ -93,30 +94,22 @@ class SegmentLoader:
   # load sys_bin_file
   def _load_seg(self, ami_bin_file, sys_bin_file):
     base_name = os.path.basename(sys_bin_file)
-    hunk_file = HunkReader()
     
     # does file exist?
     if not os.path.isfile(sys_bin_file):
       self.error = "Can't find '%s'" % sys_bin_file
       return None
-    
-    # read hunk file
-    fobj = file(sys_bin_file, "rb")
-    result = hunk_file.read_file_obj(sys_bin_file,fobj,None)
-    if result != Hunk.RESULT_OK:
-      self.error = "Error loading '%s'" % sys_bin_file
-      return None
-      
-    # build segments
-    ok = hunk_file.build_segments()
-    if not ok:
-      self.error = "Error building segments for '%s'" % sys_bin_file
-      return None
-      
-    # make sure its a loadseg()
-    if hunk_file.type != Hunk.TYPE_LOADSEG:
-      self.error = "File not loadSeg()able: '%s'" % sys_bin_file
-      return None
+
+    # try segment cache first
+    hunk_file = None
+    if self.seg_cache != None:
+      hunk_file = self.seg_cache.load(sys_bin_file)
+    if hunk_file == None:
+      hunk_file = self._read_hunk_file(sys_bin_file)
+      if hunk_file == None:
+        return None
+      if self.seg_cache != None:
+        self.seg_cache.save(sys_bin_file, hunk_file)
 
     # create relocator
     relocator = HunkRelocate(hunk_file)
@@ -133,9 +126,11 @@ class SegmentLoader:
 
       # create label
       label = None
-      name = "%s_%d:%s" % (base_name,i,names[i].replace("HUNK_","").lower())
+      seg_type = names[i].replace("HUNK_","").lower()
+      name = "%s_%d:%s" % (base_name,i,seg_type)
       if self.alloc.label_mgr != None:
-        label = LabelRange(name, seg_addr, seg_size)
+        label = LabelSegment(name, seg_addr, seg_size, seg_type)
+        self._add_debug_info(label, hunk_file.segments[i])
         self.alloc.label_mgr.add_label(label)
 
       seg = Segment(name, seg_addr, seg_size, label)
@@ -165,6 +160,41 @@ class SegmentLoader:
     
     return seg_list
     
+  def _read_hunk_file(self, sys_bin_file):
+    hunk_file = HunkReader()
+
+    # read hunk file
+    fobj = file(sys_bin_file, "rb")
+    result = hunk_file.read_file_obj(sys_bin_file,fobj,None)
+    if result != Hunk.RESULT_OK:
+      self.error = "Error loading '%s'" % sys_bin_file
+      return None
+      
+    # build segments
+    ok = hunk_file.build_segments()
+    if not ok:
+      self.error = "Error building segments for '%s'" % sys_bin_file
+      return None
+      
+    # make sure its a loadseg()
+    if hunk_file.type != Hunk.TYPE_LOADSEG:
+      self.error = "File not loadSeg()able: '%s'" % sys_bin_file
+      return None
+
+    return hunk_file
+
+  def _add_debug_info(self, label, segment):
+    """attach symbols and source lines of the hunks in segment to the label"""
+    symbols = []
+    for hunk in segment[1:]:
+      hunk_type = hunk['type']
+      if hunk_type == Hunk.HUNK_SYMBOL:
+        symbols += hunk['symbols']
+      elif hunk_type == Hunk.HUNK_DEBUG and hunk['debug_type'] == 'LINE':
+        label.add_src_lines(hunk['src_file'], hunk['debug_offset'], hunk['src_map'])
+    if len(symbols) > 0:
+      label.set_symbols(symbols)
+
   def _unload_seg(self, seg_list):
     for seg in seg_list.segments:
       # free memory of segment
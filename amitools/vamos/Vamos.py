@@ -1,6 +1,7 @@
 from LabelManager import LabelManager
 from LabelRange import LabelRange
 from MemoryAlloc import MemoryAlloc
+from MemoryAllocBins import MemoryAllocBins
 from MainMemory import MainMemory
 from AmigaLibrary import AmigaLibrary
 from LibManager import LibManager
@@ -12,6 +13,9 @@ from PortManager import PortManager
 from ErrorTracker import ErrorTracker
 from DosListManager import DosListManager
 from Trampoline import Trampoline
+from Profiler import Profiler
+from Sampler import Sampler
+from SegmentCache import SegmentCache
 
 # lib
 from lib.ExecLibrary import ExecLibrary
@@ -46,10 +50,22 @@ class Vamos:
 
     # create memory allocator
     self.mem_begin = 0x1000
-    self.alloc = MemoryAlloc(self.mem, 0, self.ram_size, self.mem_begin, self.label_mgr)
+    if cfg.mem_alloc == 'bins':
+      self.alloc = MemoryAllocBins(self.mem, 0, self.ram_size, self.mem_begin, self.label_mgr)
+    else:
+      self.alloc = MemoryAlloc(self.mem, 0, self.ram_size, self.mem_begin, self.label_mgr)
     
     # create segment loader
-    self.seg_loader = SegmentLoader( self.mem, self.alloc, self.label_mgr, self.path_mgr )
+    seg_cache = None
+    if cfg.seg_cache_dir != None:
+      seg_cache = SegmentCache(cfg.seg_cache_dir)
+    self.seg_loader = SegmentLoader( self.mem, self.alloc, self.label_mgr, self.path_mgr, seg_cache )
+
+    # call profiler
+    self.profiler = Profiler(self.label_mgr)
+
+    # PC sampling profiler
+    self.sampler = Sampler(self.label_mgr, self.mem)
 
     # lib manager
     self.lib_mgr = LibManager( self.label_mgr, cfg)
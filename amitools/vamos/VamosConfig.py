@@ -146,12 +146,18 @@ class VamosConfig(ConfigParser.SafeConfigParser):
       'memory_trace' : bool, 
       'internal_memory_trace' : bool,
       'cycles_per_block' : int, 
+      'max_cycles_per_block' : int,
       'max_cycles' : int,
       'ram_size' : int, 
       'stack_size' : int,
       'data_dir' : str,
       'cpu' : str,
-      'reg_dump' : bool
+      'reg_dump' : bool,
+      'mem_alloc' : str,
+      'profile_file' : str,
+      'profile_format' : str,
+      'sample_cycles' : int,
+      'seg_cache_dir' : str
     }
     # prefill keys with None
     for key in self._keys:
@@ -160,6 +166,15 @@ class VamosConfig(ConfigParser.SafeConfigParser):
   def _check_cpu(self, val):
     return val in ('68000','68020','000','020','00','20')
 
+  def _check_mem_alloc(self, val):
+    return val in ('list','bins')
+
+  def _check_profile_format(self, val):
+    return val in ('json','callgrind')
+
+  def _check_sample_cycles(self, val):
+    return val >= 0
+
   def _set_value(self, key, value):
     if key in self._keys:
       val_type = self._keys[key]
@@ -23,6 +23,10 @@ class VamosRun:
     self.et = vamos.error_tracker
     
     self.benchmark = benchmark
+    # cycles of all finished execute() slices
+    self.total_cycles = 0
+    # cycles run in the slice that was ended by a RESET opcode
+    self.end_slice_cycles = None
     
   def init_cpu(self):
     # prepare m68k
@@ -51,6 +55,10 @@ class VamosRun:
     self.cpu.w_reg(REG_A5, self.ctx.dos_guard_base)
     self.cpu.w_reg(REG_A6, self.ctx.dos_guard_base)
 
+  def get_total_cycles(self):
+    """return cycles run so far including the current slice"""
+    return self.total_cycles + self.cpu.get_cycles_run()
+
   def reset_func(self):
     """this callback is entered from CPU whenever a RESET opcode is encountered.
        dispatch to end vamos.
@@ -58,6 +66,8 @@ class VamosRun:
     pc = self.cpu.r_pc() - 2
     # addr == 0 or an error occurred -> end reached
     if pc == 0 or self.et.has_errors:
+      # execute() does not report the cycles of an ended slice correctly
+      self.end_slice_cycles = self.cpu.get_cycles_run()
       self.cpu.end()
       self.stay = False
     # unknown RESET opcode found
@@ -73,23 +83,81 @@ class VamosRun:
     log_main.info("done %d cycles in host time %.4fs -> %5.2f MHz m68k CPU", total_cycles, cpu_time, mhz)
     log_main.info("code time %.4fs (%.2f %%), python time %.4fs (%.2f %%) -> total time %.4fs", \
       cpu_time, cpu_percent, python_time, python_percent, delta_time)
-
-  def run(self, cycles_per_run=1000, max_cycles=0):
-    """main run loop of vamos"""
+    # slice distribution
+    num_slices = sum(self.slices.values())
+    if num_slices > 0:
+      log_main.info("executed %d slices with %.1f cycles per slice", num_slices, float(total_cycles) / num_slices)
+      for cycles in sorted(self.slices):
+        cnt = self.slices[cycles]
+        log_main.info("  %8d cycles: #%8d  (%.2f %%)", cycles, cnt, cnt * 100.0 / num_slices)
+
+  def _adapt_slice(self, cycles, min_cycles, max_cycles_per_run, trapped):
+    """return the cycles of the next slice:
+       shrink if traps fired or sub processes run, otherwise grow
+    """
+    if len(self.ctx.proc_list) > 1:
+      return min_cycles
+    elif trapped:
+      cycles /= 2
+      if cycles < min_cycles:
+        cycles = min_cycles
+    else:
+      cycles *= 2
+      if cycles > max_cycles_per_run:
+        cycles = max_cycles_per_run
+    return cycles
+
+  def run(self, cycles_per_run=1000, max_cycles=0, max_cycles_per_run=0, sample_cycles=0):
+    """main run loop of vamos.
+       the slice size starts with cycles_per_run and adapts up to
+       max_cycles_per_run. if max_cycles_per_run is not larger than
+       cycles_per_run then a fixed slice size is used.
+       if sample_cycles is given then slices of this size are run and
+       the PC is sampled after each of them.
+    """
     log_main.info("start cpu: %06x", self.ctx.process.prog_start)
 
     total_cycles = 0
+    adaptive = max_cycles_per_run > cycles_per_run
+    cycles = cycles_per_run
+    sampler = None
+    if sample_cycles > 0:
+      sampler = self.ctx.sampler
+      adaptive = False
+      cycles = sample_cycles
+    last_traps = self.cpu.get_trap_count()
+    # cycles per slice -> number of slices
+    self.slices = {}
     start_time = time.clock()
 
     # main loop
     while self.stay:
-      total_cycles += self.cpu.execute(cycles_per_run)
+      # do not run beyond max cycles
+      run_cycles = cycles
+      if max_cycles > 0 and total_cycles + run_cycles > max_cycles:
+        run_cycles = max_cycles - total_cycles
+      run_cycles_done = self.cpu.execute(run_cycles)
+      if self.end_slice_cycles != None:
+        run_cycles_done = self.end_slice_cycles
+        self.end_slice_cycles = None
+      total_cycles += run_cycles_done
+      self.total_cycles = total_cycles
+      if self.benchmark:
+        self.slices[run_cycles] = self.slices.get(run_cycles, 0) + 1
+      # take a PC sample
+      if sampler != None and self.stay:
+        sampler.sample(self.cpu.r_pc(), self.cpu.r_reg(REG_A7), self.ctx.exec_lib.stk_upper)
       # end after enough cycles
       if max_cycles > 0 and total_cycles >= max_cycles:
         break
       # some error fored a quit?
       if self.et.has_errors:
         break
+      # adapt slice size
+      if adaptive:
+        traps = self.cpu.get_trap_count()
+        cycles = self._adapt_slice(cycles, cycles_per_run, max_cycles_per_run, traps != last_traps)
+        last_traps = traps
 
     end_time = time.clock()
     
@@ -0,0 +1,122 @@
+#!/usr/bin/env python2.7
+#
+# label_bench.py [trace_log]
+#
+# replay a memory trace against the old linear LabelManager lookup and
+# the current interval index and compare the lookup times.
+#
+# the trace is a vamos log file recorded with memory tracing enabled:
+#
+#   vamos -t -l mem:debug -L trace.log <amiga binary>
+#
+# the labels are reconstructed from the label infos found in the trace.
+# without a trace file a synthetic trace is generated.
+
+import sys
+import os
+import re
+import time
+import random
+import argparse
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.realpath(__file__)), "..", "amitools", "vamos"))
+from LabelManager import LabelManager
+from LabelRange import LabelRange
+
+class LinearLabelManager:
+  """the old LabelManager lookup: scan all ranges"""
+  def __init__(self):
+    self.ranges = []
+  def add_label(self, range):
+    self.ranges.append(range)
+  def remove_label(self, range):
+    self.ranges.remove(range)
+  def get_label(self, addr):
+    for r in self.ranges:
+      if r.is_inside(addr):
+        return r
+    return None
+  def get_intersecting_labels(self, addr, size):
+    result = []
+    for r in self.ranges:
+      if r.does_intersect(addr,size):
+        result.append(r)
+    return result
+
+# R(4): 001234: 00000000  ...  [@001200 +000034 name] ...
+trace_re = re.compile(r"([RW])\((\d)\): ([0-9a-f]{6}): .*\[@([0-9a-f]{6}) \+([0-9a-f]{6}) ([^\]]*)\]")
+
+def read_trace(file_name):
+  """parse a vamos trace log and return (labels, accesses)"""
+  labels = {}
+  accesses = []
+  f = open(file_name, "r")
+  for line in f:
+    m = trace_re.search(line)
+    if m == None:
+      continue
+    num_bytes = int(m.group(2))
+    addr = int(m.group(3), 16)
+    label_addr = int(m.group(4), 16)
+    end = addr + num_bytes
+    name = m.group(6)
+    key = (label_addr, name)
+    if labels.has_key(key):
+      if end > labels[key]:
+        labels[key] = end
+    else:
+      labels[key] = end
+    accesses.append(addr)
+  f.close()
+  result = []
+  for key in labels:
+    label_addr, name = key
+    result.append((name, label_addr, labels[key] - label_addr))
+  return (result, accesses)
+
+def gen_trace(num_labels, num_accesses):
+  """generate some disjoint labels and random accesses"""
+  labels = []
+  addr = 0x1000
+  for i in xrange(num_labels):
+    size = random.randint(4, 0x1000)
+    labels.append(("label_%d" % i, addr, size))
+    addr += size + random.randint(0, 0x100)
+  accesses = []
+  for i in xrange(num_accesses):
+    accesses.append(random.randint(0, addr))
+  return (labels, accesses)
+
+def replay(mgr, labels, accesses):
+  for name, addr, size in labels:
+    mgr.add_label(LabelRange(name, addr, size))
+  start = time.time()
+  found = 0
+  for addr in accesses:
+    if mgr.get_label(addr) != None:
+      found += 1
+  end = time.time()
+  return (end - start, found)
+
+parser = argparse.ArgumentParser()
+parser.add_argument('trace_log', nargs='?', default=None, help="vamos log with memory trace")
+parser.add_argument('-n', '--num-labels', action='store', type=int, default=500, help="number of labels in synthetic trace")
+parser.add_argument('-a', '--num-accesses', action='store', type=int, default=100000, help="number of accesses in synthetic trace")
+args = parser.parse_args()
+
+if args.trace_log != None:
+  labels, accesses = read_trace(args.trace_log)
+else:
+  random.seed(0)
+  labels, accesses = gen_trace(args.num_labels, args.num_accesses)
+print "labels: %d  accesses: %d" % (len(labels), len(accesses))
+
+old_time, old_found = replay(LinearLabelManager(), labels, accesses)
+new_time, new_found = replay(LabelManager(), labels, accesses)
+print "linear: %8.4fs  found=%d" % (old_time, old_found)
+print "index:  %8.4fs  found=%d" % (new_time, new_found)
+if new_time > 0:
+  print "speedup: %.1fx" % (old_time / new_time)
+if old_found != new_found:
+  print "MISMATCH!"
+  sys.exit(1)
@@ -65,6 +65,11 @@ M68K_ALINE_RTS    = 2
 TRAP_DEFAULT  = 0
 TRAP_ONE_SHOT = 1
 TRAP_AUTO_RTS = 2
+TRAP_SNAP_REGS = 4
+
+# trap register snapshot: D0-D7, A0-A7 and a valid flag
+TRAP_NUM_REGS = 16
+TRAP_REGS_VALID = 16
 
 # --- Internal ---
 
@@ -150,6 +155,12 @@ mem_ram_write_block.argtypes = [c_uint, c_uint, c_char_p]
 mem_ram_clear_block = lib.mem_ram_clear_block
 mem_ram_clear_block.argtypes = [c_uint, c_uint, c_int]
 
+mem_ram_ptr_func = lib.mem_ram_ptr
+mem_ram_ptr_func.restype = c_void_p
+
+mem_ram_size_func = lib.mem_ram_size
+mem_ram_size_func.restype = c_uint
+
 # trap functions
 trap_init_func = lib.trap_init
 
@@ -160,6 +171,9 @@ trap_setup_func.argtypes = [trap_func, c_int]
 trap_free_func = lib.trap_free
 trap_free_func.argtypes = [c_int]
 
+trap_regs = (c_uint * (TRAP_NUM_REGS + 1)).in_dll(lib, "trap_regs")
+trap_count = c_uint.in_dll(lib, "trap_count")
+
 # --- CPU API ---
 
 def cpu_init():
@@ -203,6 +217,9 @@ def set_reg(reg, value):
 def end_timeslice():
   lib.m68k_end_timeslice()
 
+def cycles_run():
+  return lib.m68k_cycles_run()
+
 def disassemble(pc, cpu_type):
   p = create_string_buffer(80)
   n = disassemble_func(p, pc, cpu_type)
@@ -232,6 +249,12 @@ def mem_set_trace_func(func):
 def mem_is_end():
   return mem_is_end_func()
   
+def mem_ram_buffer():
+  """return the whole RAM as a writable char array without copying it"""
+  ptr = mem_ram_ptr_func()
+  size = mem_ram_size_func()
+  return (c_char * size).from_address(ptr)
+
 def mem_reserve_special_range(num_pages=1):
   return mem_reserve_special_range_func(num_pages)
 
@@ -271,6 +294,14 @@ def trap_free(tid):
   del _traps[tid]
   trap_free_func(tid)
 
+def trap_get_count():
+  """return the number of traps triggered so far"""
+  return trap_count.value
+
+def trap_get_regs():
+  """return the register snapshot array filled for TRAP_SNAP_REGS traps"""
+  return trap_regs
+
 # --- Sample ---
 
 if __name__ == "__main__":
@@ -318,6 +349,10 @@ if __name__ == "__main__":
   p = create_string_buffer(20)
   mem_ram_write_block(0, 20, p)
   mem_ram_read_block(0, 20, p)
+
+  # direct RAM buffer
+  ram = mem_ram_buffer()
+  print "RAM buffer size=%d RESET op=%s" % (len(ram), ram[0x1000:0x1002].encode('hex'))
   
   # valid range
   print "executing..."
@@ -361,6 +396,21 @@ if __name__ == "__main__":
   
   # free trap
   trap_free(tid)
+
+  # trap with register snapshot
+  regs = trap_get_regs()
+  def my_snap_trap(op, pc):
+    print "MY SNAP TRAP: D1=%08x valid=%d" % (regs[M68K_REG_D1], regs[TRAP_REGS_VALID])
+    regs[M68K_REG_D0] = 42
+  tid = trap_setup(my_snap_trap, TRAP_AUTO_RTS | TRAP_SNAP_REGS)
+  set_reg(M68K_REG_D1, 0x1234)
+  mem_ram_write(1, 0x2000, 0xa000 + tid)
+  set_reg(M68K_REG_PC,0x2000)
+  print "call snap trap"
+  print execute(4)
+  print "D0=%d" % get_reg(M68K_REG_D0)
+  print "trap count=%d" % trap_get_count()
+  trap_free(tid)
   
   # check if mem is in end mode?
   is_end = mem_is_end()
@@ -359,3 +359,13 @@ void mem_ram_clear_block(uint addr, uint size, int value)
 {
   memset(ram_data + addr, value, size);
 }
+
+uint8_t *mem_ram_ptr(void)
+{
+  return ram_data;
+}
+
+uint mem_ram_size(void)
+{
+  return ram_size;
+}
@@ -23,11 +23,42 @@ typedef struct entry entry_t;
 static entry_t traps[NUM_TRAPS];
 static entry_t *first_free;
 
+uint trap_regs[TRAP_NUM_REGS + 1];
+uint trap_count;
+
+/* call trap with a register snapshot the callback can read and modify.
+   only registers changed by the callback are written back to the CPU. */
+static void trap_call_snap_regs(trap_func_t f, uint opcode, uint pc)
+{
+  uint old_regs[TRAP_NUM_REGS];
+  int i;
+  for(i=0;i<TRAP_NUM_REGS;i++) {
+    uint val = m68k_get_reg(NULL, M68K_REG_D0 + i);
+    old_regs[i] = val;
+    trap_regs[i] = val;
+  }
+  trap_regs[TRAP_REGS_VALID] = 1;
+
+  f(opcode, pc);
+
+  trap_regs[TRAP_REGS_VALID] = 0;
+  for(i=0;i<TRAP_NUM_REGS;i++) {
+    if(trap_regs[i] != old_regs[i]) {
+      m68k_set_reg(M68K_REG_D0 + i, trap_regs[i]);
+    }
+  }
+}
+
 static int trap_aline(uint opcode, uint pc)
 {
   uint off = opcode & TRAP_MASK;
   trap_func_t f = traps[off].trap;
-  f(opcode, pc);
+  trap_count++;
+  if(traps[off].flags & TRAP_SNAP_REGS) {
+    trap_call_snap_regs(f, opcode, pc);
+  } else {
+    f(opcode, pc);
+  }
   
   int flags = traps[off].flags;
 
@@ -13,12 +13,21 @@
 #define TRAP_DEFAULT    0
 #define TRAP_ONE_SHOT   1
 #define TRAP_AUTO_RTS   2
+#define TRAP_SNAP_REGS  4
+
+/* D0-D7, A0-A7 snapshot for TRAP_SNAP_REGS traps followed by a valid flag */
+#define TRAP_NUM_REGS   16
+#define TRAP_REGS_VALID 16
 
 /* ------ Types ----- */
 typedef unsigned int uint;
 
 typedef void (*trap_func_t)(uint opcode, uint pc);
 
+/* ----- Data ----- */
+extern uint trap_regs[TRAP_NUM_REGS + 1];
+extern uint trap_count;
+
 /* ----- API ----- */
 extern void trap_init(void);
 